@@ -1,6 +1,10 @@
+from io import BytesIO
+
 from django.contrib import admin
+from django.http import HttpResponse
 
-from .models import Cart, CartItem, Category, Delivery, Order, Product, Subcategory, TelegramUser
+from .export import export_orders
+from .models import Cart, CartItem, Category, Delivery, Faq, Order, OrderItem, Product, Subcategory, TelegramUser
 
 
 @admin.register(Category)
@@ -82,12 +86,18 @@ class CartItemAdmin(admin.ModelAdmin):
     )
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
         "id",
         "user",
         "status",
+        "status_payment",
         "total_price",
         "created_at",
         "updated_at",
@@ -98,6 +108,20 @@ class OrderAdmin(admin.ModelAdmin):
         "total_price",
         "created_at",
     )
+    inlines = (OrderItemInline,)
+    actions = ("export_to_excel",)
+
+    @admin.action(description="Выгрузить в Excel")
+    def export_to_excel(self, request, queryset):
+        buffer = BytesIO()
+        export_orders(queryset, buffer)
+
+        response = HttpResponse(
+            buffer.getvalue(), content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        response["Content-Disposition"] = 'attachment; filename="orders.xlsx"'
+
+        return response
 
 
 @admin.register(Delivery)
@@ -131,3 +155,17 @@ class TelegramUserAdmin(admin.ModelAdmin):
         "user_id",
         "created_at",
     )
+
+
+@admin.register(Faq)
+class FaqAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "question",
+        "is_active",
+    )
+    list_filter = ("is_active",)
+    search_fields = (
+        "question",
+        "answer",
+    )
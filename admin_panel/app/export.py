@@ -0,0 +1,38 @@
+import pandas as pd
+from django.utils import timezone
+
+from .models import Delivery
+
+
+def export_orders(queryset, file):
+    """Выгружает заказы с доставкой и товарами в Excel."""
+
+    orders = queryset.select_related("user", "delivery").prefetch_related("items").order_by("id")
+
+    rows = []
+    for order in orders:
+        try:
+            delivery = order.delivery
+        except Delivery.DoesNotExist:
+            delivery = None
+
+        rows.append(
+            {
+                "ID заказа": order.id,
+                "Дата": timezone.localtime(order.created_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "Пользователь": f"ID: {order.user.user_id}",
+                "Телефон": delivery.phone if delivery else "не указан",
+                "Адрес": delivery.address if delivery else "",
+                "Комментарий": delivery.comment if delivery else "нет",
+                "Дата доставки": delivery.delivery_date if delivery and delivery.delivery_date else "не указана",
+                "Сумма": order.total_price,
+                "Статус": order.status,
+                "Товары": ", ".join(
+                    f"{item.product_id}. {item.title} x{item.quantity} x{item.price} руб."
+                    for item in order.items.all()
+                ),
+                "ID платежа": order.payment_id,
+            }
+        )
+
+    pd.DataFrame(rows).to_excel(file, index=False)
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from ...export import export_orders
+from ...models import Order
+
+
+class Command(BaseCommand):
+    """Выгрузка заказов в Excel, например по расписанию."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="orders.xlsx", help="Путь к файлу выгрузки")
+
+    def handle(self, *args, **options):
+        export_orders(Order.objects.all(), options["output"])
+        self.stdout.write(f"Заказы выгружены в {options['output']}")
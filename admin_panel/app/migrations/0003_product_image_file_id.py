@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2025-06-10 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_order_status_payment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_file_id",
+            field=models.CharField(
+                blank=True, editable=False, max_length=255, null=True, verbose_name="file_id фото в Telegram"
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2025-06-12 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0003_product_image_file_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="payment_id",
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name="ID платежа"),
+        ),
+        migrations.CreateModel(
+            name="OrderItem",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("title", models.CharField(max_length=200, verbose_name="Название товара")),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10, verbose_name="Цена")),
+                ("quantity", models.PositiveIntegerField(verbose_name="Количество")),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="app.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="app.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Товар в заказе",
+                "verbose_name_plural": "Товары в заказе",
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2025-06-15 12:00
+
+from django.db import migrations, models
+
+FAQ = {
+    "доставка": "Доставка осуществляется в течение 2-3 рабочих дней.",
+    "оплата": "Мы принимаем карты, электронные кошельки и наличные при самовывозе.",
+    "возврат": "Возврат возможен в течение 14 дней с момента покупки.",
+    "гарантия": "Гарантия на все товары составляет 1 год.",
+    "контакты": "Наши контакты: +7 (123) 456-78-90, email@example.com",
+}
+
+
+def create_faq(apps, schema_editor):
+    """Переносит вопросы, которые раньше были заданы в коде бота."""
+
+    Faq = apps.get_model("app", "Faq")
+    Faq.objects.bulk_create([Faq(question=question, answer=answer) for question, answer in FAQ.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0004_order_payment_id_orderitem"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Faq",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("question", models.CharField(max_length=255, verbose_name="Вопрос")),
+                ("answer", models.TextField(verbose_name="Ответ")),
+                ("is_active", models.BooleanField(default=True, verbose_name="Активен")),
+            ],
+            options={
+                "verbose_name": "Вопрос FAQ",
+                "verbose_name_plural": "FAQ",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.RunPython(create_faq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2025-06-16 12:00
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# выражение должно совпадать с запросом поиска товаров в боте, иначе PostgreSQL не использует индекс
+PRODUCT_SEARCH_VECTOR = "to_tsvector('russian', title || ' ' || coalesce(description, ''))"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_faq"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            sql=f"CREATE INDEX app_product_search_idx ON app_product USING GIN ({PRODUCT_SEARCH_VECTOR})",
+            reverse_sql="DROP INDEX IF EXISTS app_product_search_idx",
+        ),
+        migrations.RunSQL(
+            sql="CREATE INDEX app_product_title_trgm_idx ON app_product USING GIN (title gin_trgm_ops)",
+            reverse_sql="DROP INDEX IF EXISTS app_product_title_trgm_idx",
+        ),
+    ]
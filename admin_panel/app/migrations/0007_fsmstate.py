@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2025-06-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_product_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FsmState",
+            fields=[
+                ("key", models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name="Ключ")),
+                ("state", models.CharField(blank=True, max_length=255, null=True, verbose_name="Состояние")),
+                ("data", models.JSONField(default=dict, verbose_name="Данные")),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")),
+            ],
+            options={
+                "verbose_name": "Состояние диалога",
+                "verbose_name_plural": "Состояния диалогов",
+            },
+        ),
+    ]
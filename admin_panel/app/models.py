@@ -45,6 +45,9 @@ class Product(models.Model):
     slug = models.SlugField(max_length=200, unique=True, verbose_name="URL-идентификатор")
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     image = models.ImageField(upload_to="product_images/", blank=True, null=True, verbose_name="Фото товара")
+    image_file_id = models.CharField(
+        max_length=255, blank=True, null=True, editable=False, verbose_name="file_id фото в Telegram"
+    )
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     stock = models.PositiveIntegerField(default=0, verbose_name="Остаток товаров")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
@@ -111,6 +114,7 @@ class Order(models.Model):
         max_length=10, choices=PAYMENT_STATUS, default="not_paid", verbose_name="Статус оплаты"
     )
     total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Итоговая сумма")
+    payment_id = models.CharField(max_length=100, null=True, blank=True, verbose_name="ID платежа")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
@@ -123,6 +127,23 @@ class Order(models.Model):
         return f"Заказ {self.id} ({self.user.user_id})"
 
 
+class OrderItem(models.Model):
+    """Модель Товар в заказе. Название и цена сохраняются на момент оформления заказа."""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items", verbose_name="Заказ")
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, verbose_name="Товар")
+    title = models.CharField(max_length=200, verbose_name="Название товара")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Товар в заказе"
+        verbose_name_plural = "Товары в заказе"
+
+    def __str__(self):
+        return f"{self.title} x{self.quantity}"
+
+
 class Delivery(models.Model):
     """Модель Доставка."""
 
@@ -156,3 +177,35 @@ class TelegramUser(models.Model):
 
     def __str__(self):
         return f"{self.user_id}"
+
+
+class Faq(models.Model):
+    """Модель Вопрос FAQ."""
+
+    question = models.CharField(max_length=255, verbose_name="Вопрос")
+    answer = models.TextField(verbose_name="Ответ")
+    is_active = models.BooleanField(default=True, verbose_name="Активен")
+
+    class Meta:
+        verbose_name = "Вопрос FAQ"
+        verbose_name_plural = "FAQ"
+        ordering = ["id"]
+
+    def __str__(self):
+        return self.question
+
+
+class FsmState(models.Model):
+    """Модель Состояние диалога бота."""
+
+    key = models.CharField(max_length=255, primary_key=True, verbose_name="Ключ")
+    state = models.CharField(max_length=255, blank=True, null=True, verbose_name="Состояние")
+    data = models.JSONField(default=dict, verbose_name="Данные")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Состояние диалога"
+        verbose_name_plural = "Состояния диалогов"
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,31 @@
+from django.db import connection
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Faq, Product, Subcategory
+
+# канал PostgreSQL, который слушает бот для сброса кэша каталога и FAQ
+CATALOG_CHANNEL = "catalog_changed"
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Subcategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Faq)
+def notify_catalog_changed(sender, **kwargs):
+    """Сообщает боту об изменении каталога. Уведомление доставляется после фиксации транзакции."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CATALOG_CHANNEL, sender.__name__])
+
+
+@receiver(pre_save, sender=Product)
+def reset_image_file_id(sender, instance, **kwargs):
+    """Сбрасывает file_id фото товара в Telegram, если изображение заменили."""
+
+    if instance.pk is None:
+        return
+
+    old_image = Product.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+    if (old_image or "") != (instance.image.name or ""):
+        instance.image_file_id = None
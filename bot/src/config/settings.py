@@ -5,11 +5,14 @@ import django
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from asyncpg_lite import DatabaseManager
 from dotenv import load_dotenv
 from yookassa import Configuration
 
+from bot.src.middlewares.metrics import METRICS_ENABLED, ApiMetricsMiddleware
+from bot.src.middlewares.send_scheduler import send_scheduler
+from bot.src.services.fsm_storage import create_fsm_storage
+
 # Указываем путь к settings.py Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 django.setup()
@@ -29,18 +32,23 @@ group = os.getenv("GROUP_ID")
 channel_name = os.getenv("CHANNEL_NAME")
 group_name = os.getenv("GROUP_NAME")
 
-# настраиваем логирование и выводим в переменную для отдельного использования в нужных местах
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+# логирование настраивается в bot.src.middlewares.logging_logs, здесь только логгер модуля
 logger = logging.getLogger(__name__)
 
 # инициируем объект, который будет отвечать за взаимодействие с базой данных
 db_manager = DatabaseManager(db_url=os.getenv("PG_LINK"), deletion_password=os.getenv("ROOT_PASS"))
 
-storage = MemoryStorage()
+# хранилище состояний FSM переживает перезапуск и общее для нескольких экземпляров бота
+storage = create_fsm_storage()
 # бот по умолчанию будет считывать HTML теги с сообщений
 bot = Bot(token=TELEGRAM_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# время запросов к Bot API считается вместе с ожиданием в очереди отправки
+if METRICS_ENABLED:
+    bot.session.middleware(ApiMetricsMiddleware())
+# все отправки бота проходят через очередь с ограничением скорости по чатам и в целом
+bot.session.middleware(send_scheduler)
 
-dp = Dispatcher()
+dp = Dispatcher(storage=storage)
 
 # Настройка ЮКассы
 Configuration.account_id = os.getenv("YOOKASSA_SHOP_ID")
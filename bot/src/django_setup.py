@@ -9,9 +9,18 @@ admin_panel_path = os.path.join(BASE_DIR, "admin_panel")
 
 load_dotenv()
 
+# максимальное количество одновременных соединений бота с БД
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+# через сколько секунд простоя соединение пула закрывается, 0 - не закрывать
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", 300))
+
 
 def setup_django():
-    """Настройка Django."""
+    """Настройка Django.
+
+    Бот использует Django только для моделей и их метаданных, запросы к БД идут через пул asyncpg
+    (bot.src.services.repository), поэтому настроек постоянных соединений Django здесь нет.
+    """
 
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
@@ -1,16 +1,11 @@
 from aiogram import F, Router, types
-from aiogram.types import Message
+from aiogram.types import ChatMemberUpdated, Message
 
 from bot.src.handlers import users
-from bot.src.keyboards.main_menu import get_menu_keyboard
+from bot.src.keyboards.main_menu import get_buttons_for_products, get_menu_keyboard
 from bot.src.middlewares.logging_logs import logger
-from bot.src.services.utils import (
-    NOT_SUB_MESSAGE,
-    check_sub_kb,
-    get_or_create_cart,
-    is_subscribe,
-    register_user,
-)
+from bot.src.services.repository import get_product, register_user
+from bot.src.services.utils import NOT_SUB_MESSAGE, check_sub_kb, is_subscribe, subscription_cache
 
 router = Router()
 router.include_router(users.router)
@@ -21,7 +16,6 @@ async def cmd_start(message: Message):
     """Обработчик команды /start."""
 
     await register_user(message.from_user.id)
-    await get_or_create_cart(message.from_user.id)
 
     if await is_subscribe(message.from_user.id):
         try:
@@ -34,11 +28,37 @@ async def cmd_start(message: Message):
         await message.answer(NOT_SUB_MESSAGE, reply_markup=check_sub_kb(), parse_mode="HTML")
 
 
+@router.message(F.text.startswith("/start product_"))
+async def cmd_start_product(message: Message):
+    """Обработчик ссылки на карточку товара из инлайн-поиска."""
+
+    await register_user(message.from_user.id)
+
+    if not await is_subscribe(message.from_user.id):
+        await message.answer(NOT_SUB_MESSAGE, reply_markup=check_sub_kb(), parse_mode="HTML")
+        return
+
+    try:
+        product = await get_product(int(message.text.split("_", 1)[1]))
+        keyboard = await get_buttons_for_products(product_id=product.id)
+        await users.send_product_card(message, product, users.product_card_text(product), keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка открытия товара по ссылке: {e}")
+        await message.answer("Товар не найден.")
+
+
 @router.callback_query(lambda c: c.data == "check_subscription")
 async def check_subscription(callback: types.CallbackQuery):
     """Обработчик нажатия кнопки 'Проверить подписку'."""
 
-    if await is_subscribe(callback.from_user.id):
+    if await is_subscribe(callback.from_user.id, refresh=True):
         await callback.message.edit_text("✅ Спасибо за подписку! Теперь вам доступен бот.")
     else:
         await callback.answer("Вы ещё не подписались на все каналы!", show_alert=True)
+
+
+@router.chat_member()
+async def channel_member_updated(event: ChatMemberUpdated):
+    """Подписка или отписка от канала сразу обновляет кэш подписок."""
+
+    subscription_cache.update(event)
@@ -1,67 +1,137 @@
 import asyncio
 import os
-from datetime import datetime
+from datetime import date, datetime
 
-import pandas as pd
 from aiogram import F, Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     CallbackQuery,
     FSInputFile,
     InlineQuery,
     InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
     InputTextMessageContent,
     Message,
     ReplyKeyboardRemove,
 )
-from asgiref.sync import sync_to_async
 
 from admin_panel.config import settings
 from bot.src.config.settings import bot
 from bot.src.keyboards.main_menu import (
     confirm_keyboard,
-    get_button_for_cart_item,
     get_buttons_for_cart_item_delete,
     get_buttons_for_products,
     get_categories_keyboard,
     get_checkout_keyboard,
     get_faq_keyboard,
     get_menu_keyboard,
+    get_product_link_keyboard,
+    get_products_navigation_keyboard,
     get_subcategories_keyboard,
     pay_order,
+    product_search_text,
 )
 from bot.src.middlewares.logging_logs import logger
 from bot.src.payment_yookassa.payment_handler import create_yookassa_payment
-from bot.src.services.states import DeliveryState
-from bot.src.services.utils import (
-    FAQ,
-    AddTaskState,
+from bot.src.services.faq import FAQ_INLINE_CACHE_TIME, get_faq_index
+from bot.src.services.llm_cache import LLMResponseCache
+from bot.src.services.llm_scheduler import QueueFullError, UserBusyError, llm_scheduler
+from bot.src.services.repository import (
+    cancel_order,
+    checkout_order,
     create_an_order,
     delete_all_cart_item,
-    delete_cart_item,
     delete_product_cart_item,
-    get_cart_items,
     get_cart_items_for_user,
+    get_new_products,
     get_or_create_cart,
     get_or_create_cart_item,
     get_product,
-    get_products_subcategory,
+    get_products_page,
     get_subcategory,
-    save_order_delivery,
-    update_order_status,
-    update_product, GigaChatAPI
+    save_order_payment,
+    save_product_image_file_id,
+    search_products,
 )
+from bot.src.services.states import DeliveryState
+from bot.src.services.utils import AddTaskState, GigaChatAPI
 
 
 # Настройки ограничения запросов
 USER_COOLDOWN = {}
 COOLDOWN_TIME = 5  # секунд между запросами
 
+# минимальный интервал между редактированиями сообщения при потоковом ответе GigaChat, секунд
+STREAM_EDIT_INTERVAL = 1.0
+
+# количество товаров на одной странице подкатегории
+PRODUCTS_PER_PAGE = int(os.getenv("PRODUCTS_PER_PAGE", 5))
+
+# инлайн-поиск товаров: размер страницы результатов (не больше 50), время кэширования ответа в Telegram
+# и адрес, по которому доступны файлы MEDIA_ROOT, для миниатюр товаров без загруженного в Telegram фото
+PRODUCT_SEARCH_PAGE_SIZE = int(os.getenv("PRODUCT_SEARCH_PAGE_SIZE", 20))
+PRODUCT_SEARCH_CACHE_TIME = int(os.getenv("PRODUCT_SEARCH_CACHE_TIME", 60))
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "").rstrip("/")
+
 gigachat = GigaChatAPI()
+llm_cache = LLMResponseCache()
 
 router = Router()
 
 
+def product_card_text(product) -> str:
+    """Текст карточки товара в каталоге."""
+
+    return (
+        f"<b>🛒 {product.title}</b>\n"
+        f"📝 Описание: {product.description}\n"
+        f"💰 Цена: {product.price} руб.\n"
+    )
+
+
+async def send_product_card(message: Message, product, text: str, keyboard):
+    """Отправляет карточку товара, переиспользуя уже загруженное в Telegram фото."""
+
+    if not product.image:
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+        return
+
+    try:
+        if product.image_file_id:
+            photo = product.image_file_id
+        else:
+            # Полный путь к изображению
+            image_path = os.path.join(settings.MEDIA_ROOT, str(product.image))
+            if not os.path.exists(image_path):
+                await message.answer(
+                    f"{text}\nИзображение отсутствует на сервере", parse_mode="HTML", reply_markup=keyboard
+                )
+                return
+            photo = FSInputFile(image_path)
+
+        try:
+            sent = await message.answer_photo(photo=photo, caption=text, parse_mode="HTML", reply_markup=keyboard)
+        except TelegramBadRequest:
+            if not product.image_file_id:
+                raise
+            # file_id мог стать недействительным (например, после смены токена бота), загружаем фото заново
+            product.image_file_id = None
+            await send_product_card(message, product, text, keyboard)
+            return
+    except Exception as e:
+        logger.error(f"Ошибка отправки изображения: {e}")
+        await message.answer(f"{text}\nОшибка загрузки изображения", parse_mode="HTML", reply_markup=keyboard)
+        return
+
+    if not product.image_file_id:
+        product.image_file_id = sent.photo[-1].file_id
+        try:
+            await save_product_image_file_id(product.id, str(product.image), product.image_file_id)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения file_id фото товара: {e}")
+
+
 @router.callback_query(F.data == "catalog")
 async def show_categories(callback: CallbackQuery):
     """Обработчик каталога."""
@@ -141,66 +211,56 @@ async def show_subcategories_page(callback: CallbackQuery):
         await callback.answer("Произошла ошибка", show_alert=True)
 
 
+async def send_products_page(callback: CallbackQuery, subcategory_id: int, page: int = 1):
+    """Выводит страницу товаров подкатегории с изображениями."""
+
+    subcategory = await get_subcategory(subcategory_id)
+    products_data = await get_products_page(subcategory_id, page=page, per_page=PRODUCTS_PER_PAGE)
+    page_obj = products_data["page_obj"]
+    products = products_data["object_list"]
+
+    if not products:
+        await callback.message.edit_text(f"<b>{subcategory.title}</b>\n\nТовары отсутствуют", parse_mode="HTML")
+        return
+
+    # сообщение с кнопкой, по которой перешли, становится заголовком страницы
+    await callback.message.edit_text(f"<b>📋 {subcategory.title}</b>", parse_mode="HTML")
+
+    for product in products:
+        keyboard = await get_buttons_for_products(product_id=product.id)
+        await send_product_card(callback.message, product, product_card_text(product), keyboard)
+
+    num_pages = page_obj.paginator.num_pages
+    text = f"Страница {page_obj.number} из {num_pages}" if num_pages > 1 else "Переход в корзину"
+    keyboard = await get_products_navigation_keyboard(subcategory_id, page_obj.number, num_pages)
+    await callback.message.answer(text, reply_markup=keyboard)
+
+
 @router.callback_query(F.data.startswith("select_subcategory_"))
 async def select_subcategory(callback: CallbackQuery):
     """Обработчик подкатегории с выводом товаров и изображений."""
 
     try:
         subcategory_id = int(callback.data.split("_")[2])
-        subcategory = await get_subcategory(subcategory_id)
-
-        if not subcategory:
-            await callback.answer("Подкатегория не найдена", show_alert=True)
-            return
-
-        products = await get_products_subcategory(subcategory_id)
+        await send_products_page(callback, subcategory_id, page=1)
+        await callback.answer()
 
-        if not products:
-            await callback.message.edit_text(f"<b>{subcategory.title}</b>\n\nТовары отсутствуют", parse_mode="HTML")
-            return
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике подкатегории: {e}")
+        await callback.answer("Произошла ошибка при загрузке товаров", show_alert=True)
 
-        await callback.message.edit_text(f"<b>📋 {subcategory.title}</b>", parse_mode="HTML")
 
-        for product in products:
-            keyboard = await get_buttons_for_products(product_id=product.id)
-            product_text = (
-                f"<b>🛒 {product.title}</b>\n"
-                f"📝 Описание: {product.description}\n"
-                f"💰 Цена: {product.price} руб.\n"
-            )
+@router.callback_query(F.data.startswith("products_"))
+async def show_products_page(callback: CallbackQuery):
+    """Обработчик товаров подкатегории с пагинацией."""
 
-            if product.image:
-                try:
-                    # Полный путь к изображению
-                    image_path = os.path.join(settings.MEDIA_ROOT, str(product.image))
-
-                    if os.path.exists(image_path):
-                        # Отправляем изображение с подписью
-                        await callback.message.answer_photo(
-                            photo=FSInputFile(image_path),
-                            caption=product_text,
-                            parse_mode="HTML",
-                            reply_markup=keyboard,
-                        )
-                    else:
-                        await callback.message.answer(
-                            f"{product_text}\nИзображение отсутствует на сервере",
-                            parse_mode="HTML",
-                            reply_markup=keyboard,
-                        )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки изображения: {e}")
-                    await callback.message.answer(
-                        f"{product_text}\nОшибка загрузки изображения", parse_mode="HTML", reply_markup=keyboard
-                    )
-            else:
-                await callback.message.answer(product_text, reply_markup=keyboard, parse_mode="HTML")
-        keyboard_cart = await get_button_for_cart_item()
-        await callback.message.answer("Переход в корзину", reply_markup=keyboard_cart)
+    try:
+        _, subcategory_id, page = callback.data.split("_")
+        await send_products_page(callback, int(subcategory_id), page=int(page))
         await callback.answer()
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике подкатегории: {e}")
+        logger.error(f"Ошибка обработчика товаров с пагинацией: {e}")
         await callback.answer("Произошла ошибка при загрузке товаров", show_alert=True)
 
 
@@ -284,9 +344,8 @@ async def get_cart_item(callback: CallbackQuery):
     try:
         user_id = callback.from_user.id
         try:
-            cart = await get_or_create_cart(user_id)
-
-            cart_items = await get_cart_items(cart)
+            cart = await get_cart_items_for_user(user_id)
+            cart_items = cart["items"]
 
             if not cart_items:
                 await callback.message.answer("🛒 Ваша корзина пуста")
@@ -296,45 +355,23 @@ async def get_cart_item(callback: CallbackQuery):
             await callback.message.answer("🛒 Ваша корзина:", parse_mode="HTML")
 
             for item in cart_items:
-                product = await sync_to_async(lambda: item.product)()
-                keyboard = await get_buttons_for_cart_item_delete(item.id)
+                product = item["product"]
+                keyboard = await get_buttons_for_cart_item_delete(item["cart_item_id"])
                 product_text = (
                     f"<b>{product.title}</b>\n"
                     f"Описание: {product.description}\n"
                     f"Цена: {product.price} руб.\n"
-                    f"Количество: {item.quantity}\n"
-                    f"Итого: {item.quantity * product.price} руб."
+                    f"Количество: {item['quantity']}\n"
+                    f"Итого: {item['subtotal']} руб."
                 )
 
-                if product.image:
-                    try:
-                        image_path = os.path.join(settings.MEDIA_ROOT, str(product.image))
-                        if os.path.exists(image_path):
-                            await callback.message.answer_photo(
-                                photo=FSInputFile(image_path),
-                                caption=product_text,
-                                parse_mode="HTML",
-                                reply_markup=keyboard,
-                            )
-                        else:
-                            await callback.message.answer(
-                                f"{product_text}\nИзображение отсутствует на сервере",
-                                parse_mode="HTML",
-                                reply_markup=keyboard,
-                            )
-                    except Exception as e:
-                        print(f"Ошибка отправки изображения: {e}")
-                        await callback.message.answer(
-                            f"{product_text}\nОшибка загрузки изображения", parse_mode="HTML", reply_markup=keyboard
-                        )
-                else:
-                    await callback.message.answer(product_text, reply_markup=keyboard, parse_mode="HTML")
+                await send_product_card(callback.message, product, product_text, keyboard)
 
-            total = sum(item.product.price * item.quantity for item in cart_items)
+            total = cart["total"]
             await callback.message.answer(
                 f"💳 <b>Итого к оплате: {total} руб.</b>",
                 parse_mode="HTML",
-                reply_markup=await get_checkout_keyboard(cart.id, total),
+                reply_markup=await get_checkout_keyboard(cart["cart_id"], total),
             )
 
             await callback.answer()
@@ -461,7 +498,8 @@ async def process_delivery_date(message: Message, state: FSMContext):
 
     try:
         delivery_date = datetime.strptime(message.text, "%d.%m.%Y").date()
-        await state.update_data(delivery_date=delivery_date)
+        # данные состояния хранятся в JSON, поэтому дата сохраняется строкой
+        await state.update_data(delivery_date=delivery_date.isoformat())
 
         data = await state.get_data()
 
@@ -489,51 +527,46 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
         data = await state.get_data()
         user_id = callback.from_user.id
         order_id = data["order_id"]
-        total_price = data["total_price"]
 
-        await save_order_delivery(
+        checkout = await checkout_order(
             order_id=order_id,
+            user_id=user_id,
             address=data["delivery_address"],
             phone=data.get("phone", ""),
             comment=data.get("comment", ""),
-            delivery_date=data.get("delivery_date"),
+            delivery_date=date.fromisoformat(data["delivery_date"]) if data.get("delivery_date") else None,
         )
 
-        # после подтверждения заказа, получаем содержимое корзины
-        cart_items = await get_cart_items_for_user(user_id)
-
-        payment = await create_yookassa_payment(order_id, user_id, total_price)
-
-        await update_order_status(data["order_id"], "processing")
-
-        # Формируем данные для Excel
-        order_data = {
-            "ID заказа": order_id,
-            "Дата": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "Пользователь": f"ID: {user_id}",
-            "Телефон": data.get("phone", "не указан"),
-            "Адрес": data["delivery_address"],
-            "Комментарий": data.get("comment", "нет"),
-            "Дата доставки": data.get("delivery_date", "не указана"),
-            "Сумма": total_price,
-            "Статус": "processing",
-            "Товары": ", ".join(
-                [
-                    f"{item.get("product_id")}. {item.get('title')} x{item.get('quantity', 1)} x{item.get("price")} руб."
-                    for item in cart_items["items"]
-                ]
-            ),
-            "ID платежа": payment.id,
-        }
-
-        excel_file = "orders.xlsx"
-        if os.path.exists(excel_file):
-            df = pd.read_excel(excel_file)
-            df = pd.concat([df, pd.DataFrame([order_data])], ignore_index=True)
-        else:
-            df = pd.DataFrame([order_data])
+        # повторное нажатие, пока первое еще создает платеж
+        if checkout is None:
+            await callback.answer("Заказ уже оформлен")
+            return
 
-        df.to_excel(excel_file, index=False)
+        if not checkout["items"]:
+            await state.clear()
+            await callback.message.answer("🛒 Ваша корзина пуста")
+            await callback.answer()
+            return
+
+        if checkout["failed"]:
+            await state.clear()
+            shortage = "\n".join(f"{item['title']}: в наличии {item['stock']} шт." for item in checkout["failed"])
+            await callback.message.answer(
+                f"Недостаточно товаров на складе:\n{shortage}\n\nИзмените количество товаров в корзине."
+            )
+            await callback.answer()
+            return
+
+        total_price = checkout["total"]
+        # платеж создается вне транзакции, при ошибке заказ отменяется, а товары возвращаются
+        try:
+            payment = await create_yookassa_payment(order_id, user_id, total_price)
+        except Exception:
+            await cancel_order(order_id, checkout)
+            raise
+
+        # товары заказа уже сохранены в БД, выгрузка в Excel делается из админ-панели
+        await save_order_payment(order_id, payment.id)
 
         await callback.message.answer(
             "Ваш заказ оформлен!\n\n"
@@ -543,22 +576,9 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
         )
 
         await state.clear()
-        try:
-            # после подтверждения заказа, изменяем количество товаров на остатке
-            await update_product(cart_items)
-            try:
-                # очищаем корзину
-                await delete_cart_item(user_id)
-
-                await callback.answer()
-            except Exception as e:
-                logger.error(f"Ошибка очистки корзины: {e}")
-                await callback.answer("Произошла ошибка при подтверждении заказа", show_alert=True)
-        except Exception as e:
-            logger.error(f"Ошибка изменения количества товаров на остатке: {e}")
-            await callback.answer("Произошла ошибка при подтверждении заказа", show_alert=True)
+        await callback.answer()
     except Exception as e:
-        logger.error(f"Ошибка получения содержимого корзины: {e}")
+        logger.error(f"Ошибка подтверждения заказа: {e}")
         await callback.answer("Произошла ошибка при подтверждении заказа", show_alert=True)
 
 
@@ -575,32 +595,67 @@ async def handler_faq(callback: CallbackQuery):
         await callback.answer("Ошибка открытия FAQ", show_alert=True)
 
 
+async def product_inline_result(product):
+    """Результат инлайн-поиска для товара. Фото, уже загруженное в Telegram, отправляется по file_id."""
+
+    text = product_card_text(product)
+    keyboard = await get_product_link_keyboard(product.id)
+    description = f"{product.price} руб. {product.description or ''}"[:100]
+
+    if product.image_file_id:
+        return InlineQueryResultCachedPhoto(
+            id=f"product_{product.id}",
+            photo_file_id=product.image_file_id,
+            title=product.title,
+            description=description,
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=keyboard,
+        )
+
+    return InlineQueryResultArticle(
+        id=f"product_{product.id}",
+        title=product.title,
+        description=description,
+        input_message_content=InputTextMessageContent(message_text=text, parse_mode="HTML"),
+        thumbnail_url=f"{MEDIA_BASE_URL}/{product.image}" if MEDIA_BASE_URL and product.image else None,
+        reply_markup=keyboard,
+    )
+
+
+@router.inline_query(lambda query: product_search_text(query.query) is not None)
+async def inline_product_search(inline_query: InlineQuery):
+    """Инлайн-поиск товаров по названию и описанию с постраничной подгрузкой результатов."""
+
+    try:
+        text = product_search_text(inline_query.query)
+        offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+
+        # "поиск" без текста (кнопка меню) показывает новые товары, а не пустой список
+        if text:
+            found = await search_products(text, offset=offset, limit=PRODUCT_SEARCH_PAGE_SIZE)
+        else:
+            found = await get_new_products(offset=offset, limit=PRODUCT_SEARCH_PAGE_SIZE)
+        results = [await product_inline_result(product) for product in found["products"]]
+        next_offset = str(found["next_offset"]) if found["next_offset"] is not None else ""
+
+        await inline_query.answer(
+            results, cache_time=PRODUCT_SEARCH_CACHE_TIME, is_personal=False, next_offset=next_offset
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в inline_product_search: {e}")
+        await inline_query.answer([])
+
+
 @router.inline_query()
 async def inline_faq_handler(inline_query: InlineQuery):
     """Обработчик инлайн-запросов с автодополнением."""
 
     try:
-        query = inline_query.query.lower().strip()
-        results = []
-
-        for question, answer in FAQ.items():
-            # Показываем либо все вопросы при пустом запросе, либо совпадения
-            if not query or query in question.lower() or query in answer.lower():
-                result = InlineQueryResultArticle(
-                    id=str(hash(question)),
-                    title=question.capitalize(),
-                    description=answer[:100],
-                    input_message_content=InputTextMessageContent(
-                        message_text=f"<b>{question.capitalize()}</b>\n\n{answer}", parse_mode="HTML"
-                    ),
-                    reply_markup=await get_faq_keyboard(),
-                )
-                results.append(result)
-
-                if len(results) >= 50:
-                    break
-
-        await inline_query.answer(results, is_personal=True)
+        index = await get_faq_index()
+        await inline_query.answer(
+            index.search(inline_query.query), cache_time=FAQ_INLINE_CACHE_TIME, is_personal=False
+        )
     except Exception as e:
         logger.error(f"Ошибка в inline_faq_handler: {e}")
         await inline_query.answer([])
@@ -611,7 +666,8 @@ async def show_all_faq(callback: CallbackQuery):
     """Показывает все вопросы в одном сообщении."""
 
     try:
-        faq_text = "\n\n".join(f"<b>{q.capitalize()}</b>\n{a}" for q, a in FAQ.items())
+        index = await get_faq_index()
+        faq_text = "\n\n".join(f"<b>{e['question'].capitalize()}</b>\n{e['answer']}" for e in index.entries)
         await callback.message.edit_text(
             f"Часто задаваемые вопросы:\n\n{faq_text}", parse_mode="HTML", reply_markup=await get_faq_keyboard()
         )
@@ -672,23 +728,76 @@ async def command_ask_the_bot(callback: CallbackQuery):
 
 @router.message()
 async def handle_message(message: types.Message):
+    async def notify_queued(position: int):
+        await message.reply(f"⏳ Много вопросов, ваш запрос в очереди. Позиция: {position}")
+
     try:
-        await message.bot.send_chat_action(message.chat.id, 'typing')
-
-        response = await gigachat.send_message(message.text)
-
-        if response:
-            # Разбиваем длинные сообщения на части (Telegram ограничение 4096 символов)
-            if len(response) > 4000:
-                parts = [response[i:i + 4000] for i in range(0, len(response), 4000)]
-                for part in parts:
-                    await message.reply(part)
-                    await asyncio.sleep(1)  # Задержка между сообщениями
-            else:
-                await message.reply(response)
-        else:
-            await message.reply("⚠️ Не удалось получить ответ от GigaChat. Попробуйте позже.")
+        # частые вопросы отвечаются из FAQ или кэша без обращения к GigaChat
+        cached_answer = llm_cache.get(message.text, await get_faq_index())
+        if cached_answer:
+            for i in range(0, len(cached_answer), 4000):
+                await message.reply(cached_answer[i:i + 4000], parse_mode=None)
+            return
+
+        async with llm_scheduler.slot(message.from_user.id, on_queued=notify_queued):
+            await message.bot.send_chat_action(message.chat.id, 'typing')
+
+            # ответ выводится по мере генерации: первое сообщение отправляется сразу, затем редактируется
+            reply = None
+            answer = ""
+            text = ""
+            sent_text = ""
+            last_edit = 0.0
+            loop = asyncio.get_running_loop()
+
+            chunks = gigachat.stream_message(message.text)
+            while True:
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    completed = True
+                    break
+                except Exception:
+                    # ответ оборвался, уже отправленная часть остается у пользователя
+                    completed = False
+                    break
+
+                answer += chunk
+                text += chunk
+
+                # Разбиваем длинные сообщения на части (Telegram ограничение 4096 символов)
+                while len(text) > 4000:
+                    part, text = text[:4000], text[4000:]
+                    if reply is None:
+                        await message.reply(part, parse_mode=None)
+                    else:
+                        await reply.edit_text(part, parse_mode=None)
+                    reply = None
+                    sent_text = ""
+
+                if text and loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                    if reply is None:
+                        reply = await message.reply(text, parse_mode=None)
+                    else:
+                        await reply.edit_text(text, parse_mode=None)
+                    sent_text = text
+                    last_edit = loop.time()
+
+            if text and text != sent_text:
+                if reply is None:
+                    await message.reply(text, parse_mode=None)
+                else:
+                    await reply.edit_text(text, parse_mode=None)
+            elif not answer:
+                await message.reply("⚠️ Не удалось получить ответ от GigaChat. Попробуйте позже.")
+
+            if completed:
+                llm_cache.set(message.text, answer)
 
+    except UserBusyError:
+        await message.reply("⏳ Дождитесь ответа на предыдущий вопрос.")
+    except QueueFullError:
+        await message.reply("⚠️ Сейчас слишком много вопросов. Попробуйте через пару минут.")
     except Exception as e:
         logger.error(f"Ошибка в обработчике сообщений: {str(e)}")
-        await message.reply("❌ Произошла внутренняя ошибка. Пожалуйста, попробуйте еще раз.")
\ No newline at end of file
+        await message.reply("❌ Произошла внутренняя ошибка. Пожалуйста, попробуйте еще раз.")
@@ -1,7 +1,33 @@
+import os
+from typing import Optional
+
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.src.services.utils import get_categories_page, get_subcategories_page
+from bot.src.services.cache import TTLCache
+from bot.src.services.catalog import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL, get_catalog_version
+from bot.src.services.repository import get_categories_page, get_subcategories_page
+
+# имя бота для ссылок на карточку товара
+YOUR_BOT = os.getenv("YOUR_BOT")
+# с этого слова начинается инлайн-запрос поиска товаров, остальные инлайн-запросы ищут в FAQ
+PRODUCT_SEARCH_PREFIX = "поиск"
+
+# готовые клавиатуры каталога, ключ содержит версию каталога, поэтому после его изменения они строятся заново
+keyboards_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+
+def product_search_text(query: str) -> Optional[str]:
+    """Текст поиска товаров из инлайн-запроса "поиск <текст>" или None, если запрос не начинается со слова поиск.
+
+    "поиска доставки" - запрос к FAQ, "поиск" без текста - пустая строка.
+    """
+
+    words = query.split(maxsplit=1)
+    if not words or words[0].lower() != PRODUCT_SEARCH_PREFIX:
+        return None
+
+    return words[1].strip() if len(words) > 1 else ""
 
 
 def get_menu_keyboard():
@@ -9,6 +35,9 @@ def get_menu_keyboard():
 
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="Каталог", callback_data="catalog"))
+    builder.add(
+        InlineKeyboardButton(text="🔍 Поиск товаров", switch_inline_query_current_chat=f"{PRODUCT_SEARCH_PREFIX} ")
+    )
     builder.add(InlineKeyboardButton(text="Корзина", callback_data="show_cart"))
     builder.add(InlineKeyboardButton(text="FAQ", callback_data="faq"))
     builder.add(InlineKeyboardButton(text="Спросить бота", callback_data="bot"))
@@ -20,6 +49,11 @@ def get_menu_keyboard():
 async def get_categories_keyboard(page: int = 1):
     """Клавиатура Категории."""
 
+    key = ("categories", get_catalog_version(), page)
+    keyboard = keyboards_cache.get(key)
+    if keyboard is not None:
+        return keyboard
+
     categories_data = await get_categories_page(page=page)
     page_obj = categories_data["page_obj"]
     categories = categories_data["object_list"]
@@ -42,12 +76,20 @@ async def get_categories_keyboard(page: int = 1):
     builder.adjust(1)
     builder.row(main_menu)
 
-    return builder.as_markup()
+    keyboard = builder.as_markup()
+    keyboards_cache.set(key, keyboard)
+
+    return keyboard
 
 
 async def get_subcategories_keyboard(category_id: int, page: int = 1):
     """Клавиатура подкатегорий."""
 
+    key = ("subcategories", get_catalog_version(), category_id, page)
+    keyboard = keyboards_cache.get(key)
+    if keyboard is not None:
+        return keyboard
+
     subcategories_data = await get_subcategories_page(category_id, page=page)
     page_obj = subcategories_data["page_obj"]
     subcategories = subcategories_data["object_list"]
@@ -77,12 +119,21 @@ async def get_subcategories_keyboard(category_id: int, page: int = 1):
 
     builder.adjust(1)
 
-    return builder.as_markup()
+    keyboard = builder.as_markup()
+    keyboards_cache.set(key, keyboard)
+
+    return keyboard
 
 
 async def get_buttons_for_products(product_id: int, quantity: int = 0):
     """Клавиатура товаров."""
 
+    # клавиатура зависит только от товара и количества, поэтому не сбрасывается при изменении каталога
+    key = ("product", product_id, quantity)
+    keyboard = keyboards_cache.get(key)
+    if keyboard is not None:
+        return keyboard
+
     builder = InlineKeyboardBuilder()
 
     builder.add(InlineKeyboardButton(text="➖", callback_data=f"decrease_{product_id}_{quantity}"))
@@ -95,18 +146,54 @@ async def get_buttons_for_products(product_id: int, quantity: int = 0):
 
     builder.adjust(3, 1)
 
-    return builder.as_markup()
+    keyboard = builder.as_markup()
+    keyboards_cache.set(key, keyboard)
+
+    return keyboard
+
 
+async def get_product_link_keyboard(product_id: int):
+    """Клавиатура товара из результатов инлайн-поиска: открывает карточку товара в боте."""
 
-async def get_button_for_cart_item():
-    """Клавиатура для содержимого корзины."""
+    key = ("product_link", product_id)
+    keyboard = keyboards_cache.get(key)
+    if keyboard is not None:
+        return keyboard
 
     builder = InlineKeyboardBuilder()
+    builder.add(
+        InlineKeyboardButton(text="🛒 Открыть в боте", url=f"https://t.me/{YOUR_BOT}?start=product_{product_id}")
+    )
 
-    builder.add(InlineKeyboardButton(text="🛒 Корзина", callback_data="show_cart"))
+    keyboard = builder.as_markup()
+    keyboards_cache.set(key, keyboard)
 
-    builder.adjust(1)
-    return builder.as_markup()
+    return keyboard
+
+
+async def get_products_navigation_keyboard(subcategory_id: int, page: int, num_pages: int):
+    """Клавиатура переключения страниц товаров и перехода в корзину."""
+
+    key = ("products", subcategory_id, page, num_pages)
+    keyboard = keyboards_cache.get(key)
+    if keyboard is not None:
+        return keyboard
+
+    builder = InlineKeyboardBuilder()
+
+    if page > 1:
+        builder.add(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"products_{subcategory_id}_{page - 1}"))
+
+    if page < num_pages:
+        builder.add(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"products_{subcategory_id}_{page + 1}"))
+
+    builder.adjust(2)
+    builder.row(InlineKeyboardButton(text="🛒 Корзина", callback_data="show_cart"))
+
+    keyboard = builder.as_markup()
+    keyboards_cache.set(key, keyboard)
+
+    return keyboard
 
 
 async def get_buttons_for_cart_item_delete(card_id: int):
@@ -19,12 +19,40 @@ from django_setup import setup_django
 setup_django()
 
 import asyncio
+import os
 
 from aiogram.types import BotCommand, BotCommandScopeDefault
 
 from bot.src.config.settings import admins, bot, dp
+from bot.src.handlers.users import gigachat, llm_cache
+from bot.src.middlewares.metrics import (
+    METRICS_ENABLED,
+    METRICS_LOG_INTERVAL,
+    METRICS_WORKER_PORT,
+    metrics,
+    setup_dispatcher_metrics,
+)
+from bot.src.middlewares.logging_logs import LogContextMiddleware, logging_stats, setup_logging, stop_logging
+from bot.src.middlewares.send_scheduler import SEND_SUPERVISOR_RATE, bulk_sends, send_scheduler
+from bot.src.middlewares.subscription import SUBSCRIPTION_REQUIRED, SubscriptionMiddleware
+from bot.src.payment_yookassa.notifications import YOOKASSA_NOTIFICATIONS, payment_notifications
+from bot.src.payment_yookassa.payment_handler import yookassa_client
+from bot.src.services.repository import close_pool, get_pool, watch_catalog_changes
+from bot.src.services.utils import subscription_cache
+from bot.src.webhook import run_webhook, start_server
+from bot.src.workers import BOT_WORKERS, ignore_signals, run_supervisor, run_worker
 from handlers.start import router
 
+# polling - long polling, webhook - прием обновлений по HTTP (несколько экземпляров бота)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# отбрасывать ли обновления, накопившиеся пока бот был остановлен
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"
+
+# фоновые задачи, которые работают всё время жизни бота
+background_tasks = []
+# HTTP-серверы метрик процессов-обработчиков
+metrics_servers = []
+
 
 async def set_commands():
     """Настраивает командное меню(дефолтное для всех пользователей)."""
@@ -33,46 +61,136 @@ async def set_commands():
     await bot.set_my_commands(commands, BotCommandScopeDefault())
 
 
-async def start_bot():
-    """Выполнится когда бот запустится."""
+async def start_bot(worker_id: int = 0):
+    """Выполнится когда бот запустится. С несколькими обработчиками выполняется в каждом из них."""
 
-    await set_commands()
+    await get_pool()
+    background_tasks.append(asyncio.create_task(watch_catalog_changes()))
 
+    if METRICS_ENABLED and METRICS_LOG_INTERVAL:
+        background_tasks.append(asyncio.create_task(metrics.log_periodically()))
+    # /metrics основного процесса не видит обновлений, обработанных в других процессах
+    if METRICS_ENABLED and METRICS_WORKER_PORT and BOT_WORKERS > 1:
+        metrics_servers.append(await start_server(metrics.setup, port=METRICS_WORKER_PORT + worker_id))
+
+    # меню и уведомление администраторов нужны один раз, а не от каждого обработчика
+    if worker_id:
+        return
+
+    await set_commands()
     try:
-        for admin_id in admins:
-            await bot.send_message(admin_id, "Я запущен!")
+        with bulk_sends():
+            for admin_id in admins:
+                await bot.send_message(admin_id, "Я запущен!")
     except Exception as e:
         logger.error(f"Ошибка: {e}")
 
 
-async def stop_bot():
+async def stop_bot(worker_id: int = 0):
     """Выполнится когда бот завершит свою работу."""
 
-    try:
-        for admin_id in admins:
-            await bot.send_message(admin_id, "Бот остановлен!")
-    except Exception as e:
-        logger.error(f"Ошибка {e}")
+    if not worker_id:
+        try:
+            with bulk_sends():
+                for admin_id in admins:
+                    await bot.send_message(admin_id, "Бот остановлен!")
+        except Exception as e:
+            logger.error(f"Ошибка {e}")
 
+    for task in background_tasks:
+        task.cancel()
+    for runner in metrics_servers:
+        await runner.cleanup()
+    await yookassa_client.close()
+    await gigachat.close()
+    await close_pool()
 
-async def main():
+
+def setup_dispatcher():
     # регистрация роутеров
     dp.include_router(router)
     logger.info("Регистрация роутера")
 
+    # update_id и user_id в записях лога, в том числе из других middleware
+    dp.update.outer_middleware(LogContextMiddleware())
+
+    if METRICS_ENABLED:
+        # до остальных middleware бота, чтобы время обработки включало и их
+        setup_dispatcher_metrics(dp)
+        metrics.register_stats("send", send_scheduler.stats)
+        metrics.register_stats("payment_notifications", payment_notifications.stats)
+        metrics.register_stats("llm_cache", llm_cache.stats)
+        metrics.register_stats("subscription_cache", subscription_cache.stats)
+        metrics.register_stats("logging", logging_stats)
+
+    if SUBSCRIPTION_REQUIRED:
+        # до фильтров, чтобы неподписанные пользователи не доходили до обработчиков
+        dp.message.outer_middleware(SubscriptionMiddleware())
+        dp.callback_query.outer_middleware(SubscriptionMiddleware())
+
     # регистрация функций при старте и завершении работы бота
     dp.startup.register(start_bot)
     dp.shutdown.register(stop_bot)
     logger.info("Регистрация функций при старте и завершении работы бота")
 
-    # запуск бота в режиме long polling при запуске бот очищает все обновления, которые были за его моменты бездействия
+
+def worker_process(worker_id: int, updates):
+    """Точка входа процесса-обработчика при BOT_WORKERS > 1."""
+
+    ignore_signals()
+    # у каждого процесса свой файл, чтобы процессы не ротировали один файл одновременно
+    setup_logging(f"bot-worker-{worker_id}.log")
+    setup_dispatcher()
+    try:
+        asyncio.run(run_worker(dp, bot, updates, worker_id))
+    finally:
+        # процесс multiprocessing завершается без atexit, записи из очереди дописываются здесь
+        stop_logging()
+
+
+def setup_http(app):
+    """Обработчики HTTP-сервера основного процесса, кроме вебхука Telegram."""
+
+    if YOOKASSA_NOTIFICATIONS:
+        payment_notifications.setup(app)
+    if METRICS_ENABLED:
+        metrics.setup(app)
+
+
+async def main():
+    setup_dispatcher()
+    setup_app = setup_http if YOOKASSA_NOTIFICATIONS or METRICS_ENABLED else None
+    runner = None
+
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
-        logger.info("Запуск бота в режиме long polling")
+        if BOT_WORKERS > 1:
+            # основной процесс отправляет только уведомления об оплате, в пределах своей доли лимита
+            send_scheduler.set_rate(SEND_SUPERVISOR_RATE)
+            await run_supervisor(
+                worker_process,
+                bot,
+                dp.resolve_used_update_types(),
+                webhook=BOT_MODE == "webhook",
+                drop_pending_updates=DROP_PENDING_UPDATES,
+                setup_app=setup_app,
+            )
+        elif BOT_MODE == "webhook":
+            await run_webhook(dp, bot, drop_pending_updates=DROP_PENDING_UPDATES, setup_app=setup_app)
+        else:
+            if setup_app is not None:
+                runner = await start_server(setup_app)
+            await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+            logger.info("Запуск бота в режиме long polling")
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     except Exception as e:
         logger.error(f"Ошибка запуска бота в главной функции: {e}")
     finally:
+        if runner is not None:
+            await runner.cleanup()
+        await payment_notifications.close()
+        # с несколькими обработчиками основной процесс сам обращается к БД и ЮКассе из-за уведомлений
+        await yookassa_client.close()
+        await close_pool()
         await bot.session.close()
 
 
@@ -1,30 +1,175 @@
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# text - строки для чтения глазами, json - одна JSON-запись на строку для сборщиков логов
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# размер файла лога, после которого он переименовывается в bot.log.1 и т.д.
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# сколько записей может ждать записи на диск, при переполнении новые записи отбрасываются
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(context)s%(message)s"
+
+# обновление, которое сейчас обрабатывается: update_id и user_id попадают в каждую запись лога
+log_context = ContextVar("log_context", default={})
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись контекст обновления. Работает в потоке, который пишет в лог, до передачи в очередь."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        record.update_id = context.get("update_id")
+        record.user_id = context.get("user_id")
+        record.context = "".join(f"[{key} {value}] " for key, value in context.items() if value is not None)
+
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога в одну строку JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.processName,
+        }
+        for key in ("update_id", "user_id"):
+            if getattr(record, key, None) is not None:
+                data[key] = getattr(record, key)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Кладет запись в очередь и сразу возвращается, запись на диск делает поток QueueListener."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.exception_formatter = logging.Formatter()
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # текст и traceback готовятся сразу: аргументы могут измениться, пока запись ждет в очереди
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
 
-def setup_logging():
-    """Настройка логирования."""
+        return record
 
-    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # при потоке ошибок лучше потерять часть записей, чем задерживать обработку обновлений
+            self.dropped += 1
 
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
 
-    logger.handlers.clear()
+def setup_logging(file_name: str = "bot.log"):
+    """Настройка логирования.
 
-    file_handler = logging.FileHandler(LOG_DIR / "bot.log", encoding="utf-8")
-    file_handler.setFormatter(logging.Formatter(log_format))
+    Все логгеры (бота, aiogram, asyncpg...) пишут через корневой логгер в очередь, в файл с ротацией и консоль
+    записи выводит отдельный поток. Повторный вызов перенастраивает вывод, например на файл процесса-обработчика.
+    """
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = RotatingFileHandler(
+        LOG_DIR / file_name, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
 
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(logging.Formatter(log_format))
+    console_handler.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    # модуль может быть импортирован под двумя именами (middlewares.logging_logs из main.py), настройка одна
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+
+    queue_handler.listener = QueueListener(
+        queue_handler.queue, file_handler, console_handler, respect_handler_level=True
+    )
+    queue_handler.listener.start()
+
+    return logging.getLogger(__name__)
+
+
+def stop_logging():
+    """Дописывает записи из очереди и останавливает поток вывода."""
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        listener = getattr(handler, "listener", None)
+        if listener is not None:
+            root.removeHandler(handler)
+            listener.stop()
+            for target in listener.handlers:
+                target.close()
+
+
+def logging_stats() -> dict:
+    """Счетчики очереди лога."""
+
+    handlers = [handler for handler in logging.getLogger().handlers if isinstance(handler, NonBlockingQueueHandler)]
+
+    return {
+        "queued": sum(handler.queue.qsize() for handler in handlers),
+        "dropped": sum(handler.dropped for handler in handlers),
+    }
+
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+class LogContextMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: записи лога при обработке обновления содержат update_id и user_id."""
 
-    return logger
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        token = log_context.set({"update_id": event.update_id, "user_id": user.id if user else None})
+        try:
+            return await handler(event, data)
+        finally:
+            log_context.reset(token)
 
 
 logger = setup_logging()
+atexit.register(stop_logging)
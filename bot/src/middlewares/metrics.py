@@ -0,0 +1,320 @@
+import asyncio
+import os
+import secrets
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+from bot.src.middlewares.logging_logs import logger
+
+# сбор метрик обработки обновлений, запросов к БД и Bot API
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+# если задан, /metrics требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# как часто в секундах писать в лог сводку по обработчикам, 0 - не писать
+METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", 300))
+# при BOT_WORKERS > 1 обработчик N отдает свои метрики на порту METRICS_WORKER_PORT + N, 0 - не отдавать
+METRICS_WORKER_PORT = int(os.getenv("METRICS_WORKER_PORT", 0))
+METRICS_SUMMARY_SIZE = 10
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class UpdateStats:
+    """Что сделал обработчик одного обновления."""
+
+    __slots__ = ("handler", "db_queries", "db_seconds", "api_calls")
+
+    def __init__(self):
+        self.handler = None
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.api_calls = 0
+
+
+# статистика обновления, которое сейчас обрабатывается (видна и в созданных им задачах)
+current_update = ContextVar("current_update", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Счетчик в формате Prometheus."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = defaultdict(float)
+
+    def inc(self, *labels, value: float = 1):
+        self._values[labels] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+
+        return lines
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # метки -> [количество в каждой корзине, сумма, количество]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._series.items():
+            for bound, value in zip(self.buckets, counts):
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {value}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+
+        return lines
+
+
+class Metrics:
+    """Метрики процесса бота: гистограммы по обработчикам, запросы к БД и Bot API, счетчики сервисов."""
+
+    def __init__(self):
+        self.update_seconds = Histogram(
+            "bot_update_duration_seconds", "Время обработки обновления", ("event", "handler")
+        )
+        self.update_db_queries = Histogram(
+            "bot_update_db_queries", "Запросов к БД за обновление", ("event", "handler"), COUNT_BUCKETS
+        )
+        self.update_db_seconds = Histogram(
+            "bot_update_db_seconds", "Время запросов к БД за обновление", ("event", "handler")
+        )
+        self.update_api_calls = Histogram(
+            "bot_update_api_calls", "Запросов к Bot API за обновление", ("event", "handler"), COUNT_BUCKETS
+        )
+        self.update_errors = Counter(
+            "bot_update_errors_total", "Исключения при обработке обновлений", ("event", "handler", "exception")
+        )
+        self.db_query_seconds = Histogram("bot_db_query_seconds", "Время запроса к БД")
+        self.db_errors = Counter("bot_db_errors_total", "Ошибки запросов к БД")
+        self.api_seconds = Histogram("bot_api_request_seconds", "Время запроса к Bot API", ("method",))
+        self.api_errors = Counter("bot_api_errors_total", "Ошибки запросов к Bot API", ("method", "exception"))
+        # счетчики сервисов: имя -> функция, возвращающая словарь чисел
+        self._stats = {}
+        # сводка для лога с прошлой записи: обработчик -> [обновлений, время, максимум, запросов к БД, ошибок]
+        self._window = defaultdict(lambda: [0, 0.0, 0.0, 0, 0])
+
+    def register_stats(self, name: str, stats: Callable[[], dict]):
+        """Добавляет в /metrics счетчики сервиса, например send_scheduler.stats."""
+
+        self._stats[name] = stats
+
+    def record_update(self, event: str, stats: UpdateStats, seconds: float, error: str = None):
+        handler = stats.handler or "unhandled"
+        self.update_seconds.observe(seconds, event, handler)
+        self.update_db_queries.observe(stats.db_queries, event, handler)
+        self.update_db_seconds.observe(stats.db_seconds, event, handler)
+        self.update_api_calls.observe(stats.api_calls, event, handler)
+        if error:
+            self.update_errors.inc(event, handler, error)
+
+        window = self._window[f"{event}:{handler}"]
+        window[0] += 1
+        window[1] += seconds
+        window[2] = max(window[2], seconds)
+        window[3] += stats.db_queries
+        window[4] += bool(error)
+
+    def record_query(self, seconds: float, failed: bool = False):
+        self.db_query_seconds.observe(seconds)
+        if failed:
+            self.db_errors.inc()
+
+        stats = current_update.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += seconds
+
+    def render(self) -> str:
+        lines = []
+        for metric in (
+            self.update_seconds,
+            self.update_db_queries,
+            self.update_db_seconds,
+            self.update_api_calls,
+            self.update_errors,
+            self.db_query_seconds,
+            self.db_errors,
+            self.api_seconds,
+            self.api_errors,
+        ):
+            lines.extend(metric.render())
+
+        for name, stats in self._stats.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.error(f"Ошибка получения счетчиков {name}: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"bot_{name}_{key} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if METRICS_TOKEN and not secrets.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+        ):
+            return web.Response(status=401)
+
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    def setup(self, app: web.Application):
+        """Добавляет /metrics в приложение aiohttp."""
+
+        app.router.add_get(METRICS_PATH, self.handle)
+
+    def summary(self) -> str:
+        """Самые долгие обработчики с прошлой сводки, по суммарному времени."""
+
+        window, self._window = self._window, defaultdict(lambda: [0, 0.0, 0.0, 0, 0])
+        top = sorted(window.items(), key=lambda item: item[1][1], reverse=True)[:METRICS_SUMMARY_SIZE]
+
+        return "\n".join(
+            f"{handler}: {count} обн., среднее {total / count * 1000:.0f} мс, макс {slowest * 1000:.0f} мс, "
+            f"запросов к БД {queries / count:.1f}, ошибок {errors}"
+            for handler, (count, total, slowest, queries, errors) in top
+        )
+
+    async def log_periodically(self, interval: int = METRICS_LOG_INTERVAL):
+        """Пишет сводку по обработчикам в лог раз в interval секунд."""
+
+        while True:
+            await asyncio.sleep(interval)
+            summary = self.summary()
+            if summary:
+                logger.info(f"Обработка обновлений за {interval} с:\n{summary}")
+
+
+metrics = Metrics()
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: время обработки, запросы к БД и Bot API, исключения."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        error = None
+
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            current_update.reset(token)
+            metrics.record_update(event.event_type, stats, time.perf_counter() - started, error)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware событий: запоминает, какой обработчик выбран для обновления."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = current_update.get()
+        handler_object = data.get("handler")
+        if stats is not None and handler_object is not None:
+            stats.handler = getattr(handler_object.callback, "__name__", type(handler_object.callback).__name__)
+
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки запросов к Bot API, включая ожидание в очереди отправки."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        stats = current_update.get()
+        if stats is not None:
+            stats.api_calls += 1
+
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.api_seconds.observe(time.perf_counter() - started, name)
+
+
+def log_asyncpg_query(record):
+    """Обработчик add_query_logger соединений asyncpg. Бот обращается к БД только через пул asyncpg."""
+
+    metrics.record_query(record.elapsed, record.exception is not None)
+
+
+def setup_dispatcher_metrics(dispatcher):
+    """Подключает middleware метрик к диспетчеру."""
+
+    dispatcher.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_name = HandlerNameMiddleware()
+    for name, observer in dispatcher.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_name)
@@ -0,0 +1,229 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from bot.src.middlewares.logging_logs import logger
+
+# ограничения Telegram: около 30 сообщений в секунду всего, 1 в секунду в личный чат и 20 в минуту в группу
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+# общее ведро у каждого процесса свое, при BOT_WORKERS > 1 лимит бота делится между процессами
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+# доля основного процесса при BOT_WORKERS > 1: он сам отправляет только уведомления об оплате
+SEND_SUPERVISOR_RATE = min(float(os.getenv("SEND_SUPERVISOR_RATE", 2)), SEND_GLOBAL_RATE / 2)
+# остальное поровну между процессами-обработчиками
+SEND_WORKER_RATE = (SEND_GLOBAL_RATE - SEND_SUPERVISOR_RATE) / BOT_WORKERS
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", 20 / 60))
+# сколько сообщений можно отправить подряд без ожидания
+SEND_CHAT_BURST = 3
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 3))
+SEND_MAX_CHATS = 10000
+
+# методы, которые не создают и не меняют сообщения, но начинаются с send
+UNLIMITED_SEND_METHODS = {"sendChatAction"}
+LIMITED_METHODS = {"copyMessage", "copyMessages", "forwardMessage", "forwardMessages"}
+
+# приоритеты отправки, меньше - раньше
+INTERACTIVE = 0
+BULK = 1
+
+send_priority = ContextVar("send_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_sends():
+    """Запросы внутри блока (и созданных в нем задач) пропускают вперед ответы пользователям."""
+
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """Ведро токенов: rate запросов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self) -> float:
+        """Через сколько секунд можно будет взять токен."""
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        """Запрет отправки после ответа 429 от Telegram."""
+
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    @property
+    def idle(self) -> bool:
+        return self.delay() == 0 and self.tokens >= self.capacity
+
+
+def is_limited(method: TelegramMethod) -> bool:
+    """Создает или меняет сообщение в чате. Чтения (getChatMember...) и sendChatAction лимиты не расходуют."""
+
+    name = method.__api_method__
+    if name in UNLIMITED_SEND_METHODS:
+        return False
+
+    return name.startswith(("send", "edit")) or name in LIMITED_METHODS
+
+
+class ChatLimiter:
+    """Ограничение отправки в один чат."""
+
+    def __init__(self, chat_id):
+        # в личный чат id положительный, в группы и каналы отрицательный или @username
+        try:
+            private = int(chat_id) > 0
+        except ValueError:
+            private = False
+        rate = SEND_CHAT_RATE if private else SEND_GROUP_RATE
+        self.bucket = TokenBucket(rate, SEND_CHAT_BURST)
+        # сообщения в один чат уходят в порядке вызова
+        self.lock = asyncio.Lock()
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Очередь исходящих запросов к Bot API.
+
+    Отправка и изменение сообщений проходят через ведро токенов чата и общее ведро бота, общее ведро раздает
+    токены по приоритету. При ответе 429 чат приостанавливается на retry_after секунд и запрос повторяется.
+    Остальные запросы (getUpdates, getChatMember, answerCallbackQuery, sendChatAction...) не ограничиваются.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE if BOT_WORKERS == 1 else SEND_WORKER_RATE):
+        self.set_rate(global_rate)
+        self._chats = {}
+        self._waiters = []
+        self._counter = itertools.count()
+        self._pump_task = None
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.retry_after_seconds = 0
+        self.wait_seconds = 0.0
+
+    def set_rate(self, global_rate: float):
+        """Задает лимит общего ведра, например долю основного процесса при BOT_WORKERS > 1."""
+
+        # при лимите меньше 1 в секунду ведро должно вмещать хотя бы один токен
+        self.bucket = TokenBucket(global_rate, max(global_rate, 1))
+
+    def _chat(self, chat_id) -> ChatLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is None:
+            if len(self._chats) >= SEND_MAX_CHATS:
+                self._chats = {
+                    key: value for key, value in self._chats.items() if value.lock.locked() or not value.bucket.idle
+                }
+            limiter = self._chats[chat_id] = ChatLimiter(chat_id)
+
+        return limiter
+
+    async def _global_slot(self, priority: int):
+        """Токен общего ведра. Если токенов нет, ожидающие получают их по приоритету, затем по очереди."""
+
+        if not self._waiters and self.bucket.delay() == 0:
+            self.bucket.take()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+        await future
+
+    async def _pump(self):
+        while self._waiters:
+            delay = self.bucket.delay()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.bucket.take()
+                future.set_result(None)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not is_limited(method):
+            return await make_request(bot, method)
+
+        chat = self._chat(chat_id)
+        priority = send_priority.get()
+        started = time.monotonic()
+
+        async with chat.lock:
+            for attempt in range(SEND_MAX_RETRIES + 1):
+                while delay := chat.bucket.delay():
+                    await asyncio.sleep(delay)
+                chat.bucket.take()
+                await self._global_slot(priority)
+
+                waited = time.monotonic() - started
+                try:
+                    response = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    self.retries += 1
+                    self.retry_after_seconds += e.retry_after
+                    chat.bucket.block(e.retry_after)
+                    logger.warning(f"Telegram ограничил отправку в чат {chat_id} на {e.retry_after} с")
+                    if attempt == SEND_MAX_RETRIES:
+                        self.failed += 1
+                        raise
+                    continue
+                except Exception:
+                    self.failed += 1
+                    raise
+
+                self.sent += 1
+                self.wait_seconds += waited
+                return response
+
+    def stats(self) -> dict:
+        """Счетчики отправки."""
+
+        return {
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "retry_after_seconds": self.retry_after_seconds,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "queued": len(self._waiters),
+            "chats": len(self._chats),
+        }
+
+
+send_scheduler = SendScheduler()
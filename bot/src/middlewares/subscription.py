@@ -0,0 +1,34 @@
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from bot.src.services.utils import NOT_SUB_MESSAGE, check_sub_kb, is_subscribe
+
+# true - все сообщения и кнопки, кроме /start и проверки подписки, доступны только подписчикам канала
+SUBSCRIPTION_REQUIRED = os.getenv("SUBSCRIPTION_REQUIRED", "false").lower() == "true"
+
+
+class SubscriptionMiddleware(BaseMiddleware):
+    """Пропускает к обработчикам только подписчиков канала, подписка проверяется через кэш."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        # /start и кнопка проверки подписки сами проверяют подписку и показывают приглашение
+        if isinstance(event, Message) and (event.text or "").startswith("/start"):
+            return await handler(event, data)
+        if isinstance(event, CallbackQuery) and event.data == "check_subscription":
+            return await handler(event, data)
+
+        if event.from_user is None or await is_subscribe(event.from_user.id):
+            return await handler(event, data)
+
+        if isinstance(event, CallbackQuery):
+            await event.answer("Вы ещё не подписались на все каналы!", show_alert=True)
+        else:
+            await event.answer(NOT_SUB_MESSAGE, reply_markup=check_sub_kb(), parse_mode="HTML")
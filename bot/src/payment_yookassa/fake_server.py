@@ -0,0 +1,146 @@
+# Локальная имитация API ЮКассы для тестов.
+# Запуск: python -m bot.src.payment_yookassa.fake_server
+# В .env бота указать YOOKASSA_API_URL=http://localhost:8081/v3
+# Уведомления: YOOKASSA_NOTIFICATIONS=true, YOOKASSA_NOTIFY_IPS=* в .env бота и
+# YOOKASSA_FAKE_NOTIFY_URL=http://localhost/yookassa/notifications для fake-сервера.
+# Переход по ссылке оплаты (GET /checkout/{id}) или POST /v3/payments/{id}/succeed и /cancel
+# меняют статус платежа и отправляют уведомление боту.
+# В тестах ответы из app["faults"] выдаются вместо ответов API по одному, app["requests"] - полученные запросы.
+import os
+import uuid
+from datetime import datetime, timezone
+
+import aiohttp
+from aiohttp import web
+
+YOOKASSA_FAKE_PORT = int(os.getenv("YOOKASSA_FAKE_PORT", 8081))
+YOOKASSA_FAKE_NOTIFY_URL = os.getenv("YOOKASSA_FAKE_NOTIFY_URL")
+
+
+@web.middleware
+async def inject_faults(request: web.Request, handler):
+    """Запоминает запросы к API и отвечает заготовленными ошибками, пока они есть."""
+
+    if request.path.startswith("/v3/"):
+        request.app["requests"].append(
+            {"method": request.method, "path": request.path, "idempotence_key": request.headers.get("Idempotence-Key")}
+        )
+        if request.app["faults"]:
+            return request.app["faults"].pop(0)
+
+    return await handler(request)
+
+
+async def create_payment(request: web.Request):
+    """Создает платеж, повторный запрос с тем же ключом идемпотентности возвращает тот же платеж."""
+
+    idempotence_key = request.headers.get("Idempotence-Key")
+    if not idempotence_key:
+        return web.json_response({"type": "error", "code": "invalid_request"}, status=400)
+
+    keys = request.app["keys"]
+    if idempotence_key in keys:
+        return web.json_response(request.app["payments"][keys[idempotence_key]])
+
+    body = await request.json()
+    payment_id = str(uuid.uuid4())
+    payment = {
+        "id": payment_id,
+        "status": "pending",
+        "paid": False,
+        "amount": body["amount"],
+        "confirmation": {
+            "type": "redirect",
+            "confirmation_url": f"{request.url.origin()}/checkout/{payment_id}",
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "description": body.get("description"),
+        "metadata": body.get("metadata", {}),
+        "test": True,
+    }
+
+    request.app["payments"][payment_id] = payment
+    keys[idempotence_key] = payment_id
+
+    return web.json_response(payment)
+
+
+async def get_payment(request: web.Request):
+    """Возвращает платеж по id."""
+
+    payment = request.app["payments"].get(request.match_info["payment_id"])
+    if payment is None:
+        return web.json_response({"type": "error", "code": "not_found"}, status=404)
+
+    return web.json_response(payment)
+
+
+async def notify(payment: dict) -> int:
+    """Отправляет боту уведомление о платеже, как ЮКасса. Возвращает HTTP-статус ответа бота."""
+
+    if not YOOKASSA_FAKE_NOTIFY_URL:
+        return 0
+
+    event = {"succeeded": "payment.succeeded", "canceled": "payment.canceled"}[payment["status"]]
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            YOOKASSA_FAKE_NOTIFY_URL, json={"type": "notification", "event": event, "object": payment}
+        ) as response:
+            return response.status
+
+
+async def set_status(request: web.Request, status: str) -> web.Response:
+    payment = request.app["payments"].get(request.match_info["payment_id"])
+    if payment is None:
+        return web.json_response({"type": "error", "code": "not_found"}, status=404)
+
+    if payment["status"] == "pending":
+        payment["status"] = status
+        payment["paid"] = status == "succeeded"
+
+    notified = await notify(payment)
+
+    return web.json_response({**payment, "notification_status": notified})
+
+
+async def succeed_payment(request: web.Request):
+    """Имитирует успешную оплату."""
+
+    return await set_status(request, "succeeded")
+
+
+async def cancel_payment(request: web.Request):
+    """Имитирует отмену платежа."""
+
+    return await set_status(request, "canceled")
+
+
+async def checkout(request: web.Request):
+    """Страница оплаты из confirmation_url: сразу проводит платеж."""
+
+    response = await set_status(request, "succeeded")
+    if response.status != 200:
+        return response
+
+    return web.Response(text="Платеж проведен, можно вернуться в бота.")
+
+
+def create_app() -> web.Application:
+    """Приложение fake-сервера."""
+
+    app = web.Application(middlewares=[inject_faults])
+    app["payments"] = {}
+    app["keys"] = {}
+    app["faults"] = []
+    app["requests"] = []
+    app.router.add_post("/v3/payments", create_payment)
+    app.router.add_get("/v3/payments/{payment_id}", get_payment)
+    app.router.add_post("/v3/payments/{payment_id}/succeed", succeed_payment)
+    app.router.add_post("/v3/payments/{payment_id}/cancel", cancel_payment)
+    app.router.add_get("/checkout/{payment_id}", checkout)
+
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=YOOKASSA_FAKE_PORT)
@@ -0,0 +1,206 @@
+import asyncio
+import ipaddress
+import os
+
+from aiohttp import web
+
+from bot.src.config.settings import bot
+from bot.src.middlewares.logging_logs import logger
+from bot.src.middlewares.send_scheduler import bulk_sends
+from bot.src.payment_yookassa.payment_handler import YooKassaError, yookassa_client
+from bot.src.services.cache import TTLCache
+from bot.src.services.repository import apply_payment_events
+
+# прием уведомлений ЮКассы о платежах, адрес уведомлений указывается в личном кабинете ЮКассы
+YOOKASSA_NOTIFICATIONS = os.getenv("YOOKASSA_NOTIFICATIONS", "false").lower() == "true"
+YOOKASSA_NOTIFY_PATH = os.getenv("YOOKASSA_NOTIFY_PATH", "/yookassa/notifications")
+# адреса, с которых ЮКасса отправляет уведомления; * - не проверять (для fake_server)
+YOOKASSA_NOTIFY_IPS = os.getenv(
+    "YOOKASSA_NOTIFY_IPS",
+    "185.71.76.0/27,185.71.77.0/27,77.75.153.0/25,77.75.156.11,77.75.156.35,77.75.154.128/25,2a02:5180::/32",
+)
+# бот работает за одним доверенным прокси, адрес отправителя - последний в X-Forwarded-For
+YOOKASSA_NOTIFY_TRUST_PROXY = os.getenv("YOOKASSA_NOTIFY_TRUST_PROXY", "false").lower() == "true"
+# за сколько секунд уведомления собираются в одно обновление БД
+YOOKASSA_NOTIFY_BATCH_DELAY = float(os.getenv("YOOKASSA_NOTIFY_BATCH_DELAY", 0.1))
+YOOKASSA_NOTIFY_BATCH_SIZE = 100
+
+# событие уведомления -> статус платежа в API
+PAYMENT_EVENTS = {
+    "payment.succeeded": "succeeded",
+    "payment.canceled": "canceled",
+}
+
+USER_MESSAGES = {
+    "payment.succeeded": "✅ Оплата заказа №{order_id} получена. Спасибо за покупку!",
+    "payment.canceled": "❌ Платеж по заказу №{order_id} отменен, заказ аннулирован.",
+}
+
+
+def _networks(value: str):
+    if value.strip() == "*":
+        return None
+
+    return [ipaddress.ip_network(item.strip()) for item in value.split(",") if item.strip()]
+
+
+class PaymentNotifications:
+    """Прием уведомлений ЮКассы.
+
+    Уведомление проверяется по адресу отправителя и запросом платежа в API ЮКассы (статус из API, а не из тела
+    уведомления). Повторные уведомления отсекаются по недавно обработанным платежам и условием в запросе к БД.
+    События за YOOKASSA_NOTIFY_BATCH_DELAY секунд применяются к заказам одним запросом, ответ 200 отправляется
+    после фиксации изменений, иначе ЮКасса повторит уведомление.
+    """
+
+    def __init__(self, allowed_ips: str = YOOKASSA_NOTIFY_IPS):
+        self.networks = _networks(allowed_ips)
+        self._processed = TTLCache(maxsize=10000, ttl=86400)
+        self._batch = {}
+        self._flush_task = None
+        self._notify_tasks = set()
+        self.received = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.applied = 0
+
+    def _allowed(self, request: web.Request) -> bool:
+        if self.networks is None:
+            return True
+
+        remote = request.remote
+        if YOOKASSA_NOTIFY_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+            # прокси дописывает адрес отправителя в конец, начало заголовка задает сам клиент
+            remote = request.headers["X-Forwarded-For"].split(",")[-1].strip()
+
+        try:
+            address = ipaddress.ip_address(remote)
+        except ValueError:
+            return False
+
+        return any(address in network for network in self.networks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.received += 1
+        if not self._allowed(request):
+            self.rejected += 1
+            logger.warning(f"Уведомление ЮКассы с недоверенного адреса {request.remote}")
+            return web.Response(status=403)
+
+        try:
+            body = await request.json()
+            event = body["event"]
+            payment_id = body["object"]["id"]
+        except Exception:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        # другие события (например, возвраты) не меняют заказы
+        if event not in PAYMENT_EVENTS:
+            return web.Response()
+
+        key = (payment_id, event)
+        if key in self._processed:
+            self.duplicates += 1
+            return web.Response()
+
+        try:
+            payment = await yookassa_client.get_payment(payment_id)
+        except YooKassaError as e:
+            logger.error(f"Не удалось проверить платеж {payment_id}: {e}")
+            return web.Response(status=502)
+
+        order_id = (payment.metadata or {}).get("order_id")
+        if payment.status != PAYMENT_EVENTS[event] or not order_id:
+            self.rejected += 1
+            logger.warning(f"Уведомление {event} не подтверждается платежом {payment_id} ({payment.status})")
+            return web.Response(status=400)
+
+        try:
+            await self._enqueue(int(order_id), payment_id, event)
+        except Exception as e:
+            logger.error(f"Ошибка применения уведомления ЮКассы по платежу {payment_id}: {e}")
+            return web.Response(status=500)
+
+        self._processed.set(key, True)
+        return web.Response()
+
+    async def _enqueue(self, order_id: int, payment_id: str, event: str):
+        """Добавляет событие в пакет и ждет, пока пакет будет сохранен."""
+
+        key = (order_id, payment_id, event)
+        future = self._batch.get(key)
+        if future is None:
+            future = self._batch[key] = asyncio.get_running_loop().create_future()
+
+        if len(self._batch) >= YOOKASSA_NOTIFY_BATCH_SIZE:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        await asyncio.shield(future)
+
+    async def _flush_later(self):
+        await asyncio.sleep(YOOKASSA_NOTIFY_BATCH_DELAY)
+        await self.flush()
+
+    async def flush(self):
+        """Применяет накопленные события к заказам одним запросом."""
+
+        batch, self._batch = self._batch, {}
+        if not batch:
+            return
+
+        try:
+            changed = await apply_payment_events(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future in batch.values():
+            if not future.done():
+                future.set_result(None)
+
+        self.applied += len(changed)
+        if changed:
+            task = asyncio.create_task(self._notify_users(changed))
+            self._notify_tasks.add(task)
+            task.add_done_callback(self._notify_tasks.discard)
+
+    async def _notify_users(self, changed: list):
+        # уведомления уходят через очередь отправки после ответов пользователям
+        with bulk_sends():
+            for order in changed:
+                try:
+                    await bot.send_message(
+                        order["telegram_id"], USER_MESSAGES[order["event"]].format(order_id=order["order_id"])
+                    )
+                except Exception as e:
+                    logger.error(f"Не удалось уведомить пользователя о заказе {order['order_id']}: {e}")
+
+    async def close(self):
+        """Сохраняет оставшиеся события и дожидается отправки уведомлений пользователям."""
+
+        await self.flush()
+        if self._notify_tasks:
+            await asyncio.wait(set(self._notify_tasks))
+
+    def setup(self, app: web.Application):
+        """Добавляет обработчик уведомлений в приложение aiohttp."""
+
+        app.router.add_post(YOOKASSA_NOTIFY_PATH, self.handle)
+
+    def stats(self) -> dict:
+        """Счетчики уведомлений."""
+
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+            "applied": self.applied,
+        }
+
+
+payment_notifications = PaymentNotifications()
@@ -1,8 +1,12 @@
+import asyncio
 import os
 import uuid
 
+import aiohttp
 from dotenv import load_dotenv
-from yookassa import Payment
+from yookassa.domain.response import PaymentResponse
+
+from bot.src.middlewares.logging_logs import logger
 
 load_dotenv()
 
@@ -11,24 +15,112 @@ YOUR_BOT = os.getenv("YOUR_BOT")
 YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
 
+# адрес API можно заменить на локальный fake_server для тестов
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT", 10))
+YOOKASSA_MAX_CONCURRENCY = int(os.getenv("YOOKASSA_MAX_CONCURRENCY", 10))
+YOOKASSA_RETRIES = 3
 
-async def create_yookassa_payment(order_id: int, user_id: int, total_price: float):
-    """Создание платежа в Юкасса."""
 
-    idempotence_key = str(uuid.uuid4())  # Уникальный ключ идемпотентности
+class YooKassaError(Exception):
+    """Ошибка API ЮКассы."""
+
+
+class YooKassaClient:
+    """Асинхронный клиент API ЮКассы с общей сессией и ограничением одновременных запросов."""
+
+    def __init__(self, shop_id: str, secret_key: str, api_url: str = YOOKASSA_API_URL):
+        self.api_url = api_url.rstrip("/")
+        self._auth = aiohttp.BasicAuth(shop_id or "", secret_key or "")
+        self._timeout = aiohttp.ClientTimeout(total=YOOKASSA_TIMEOUT)
+        self._semaphore = asyncio.Semaphore(YOOKASSA_MAX_CONCURRENCY)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия создается при первом запросе внутри запущенного цикла событий."""
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(auth=self._auth, timeout=self._timeout)
+
+        return self._session
+
+    async def close(self):
+        """Закрывает сессию."""
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method: str, path: str, json: dict = None, idempotence_key: str = None) -> dict:
+        """Запрос к API с повторами. Повтор безопасен, так как ключ идемпотентности не меняется."""
+
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else {}
+        error = None
+
+        for attempt in range(1, YOOKASSA_RETRIES + 1):
+            try:
+                async with self._semaphore:
+                    async with self._get_session().request(
+                        method, f"{self.api_url}{path}", json=json, headers=headers
+                    ) as response:
+                        try:
+                            data = await response.json(content_type=None)
+                            body = data
+                        except ValueError:
+                            # тело не JSON, например HTML-страница 502 от прокси
+                            data = None
+                            body = (await response.text())[:200]
+
+                # 202 - запрос с этим ключом еще обрабатывается, 5xx - временная ошибка ЮКассы
+                if response.status == 202 or response.status >= 500:
+                    error = YooKassaError(f"Статус {response.status}: {body}")
+                elif response.status >= 400:
+                    raise YooKassaError(f"Статус {response.status}: {body}")
+                elif data is None:
+                    error = YooKassaError(f"Статус {response.status}: ответ не в формате JSON")
+                else:
+                    return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
 
-    payment = Payment.create(
-        {
-            "amount": {"value": f"{total_price:.2f}", "currency": "RUB"},
-            "confirmation": {
-                "type": "redirect",
-                "return_url": f"https://t.me/{YOUR_BOT}",  # Вернет пользователя в бота
+            logger.warning(f"Ошибка запроса к ЮКассе (попытка {attempt}): {error}")
+            if attempt < YOOKASSA_RETRIES:
+                await asyncio.sleep(attempt)
+
+        raise YooKassaError(f"ЮКасса недоступна: {error}")
+
+    async def create_payment(self, order_id: int, user_id: int, total_price) -> PaymentResponse:
+        """Создание платежа. Ключ идемпотентности выводится из номера заказа."""
+
+        idempotence_key = str(uuid.uuid5(uuid.NAMESPACE_URL, f"order:{order_id}"))
+
+        data = await self._request(
+            "POST",
+            "/payments",
+            json={
+                "amount": {"value": f"{total_price:.2f}", "currency": "RUB"},
+                "confirmation": {
+                    "type": "redirect",
+                    "return_url": f"https://t.me/{YOUR_BOT}",  # Вернет пользователя в бота
+                },
+                "capture": True,
+                "description": f"Оплата заказа №{order_id}",
+                "metadata": {"order_id": order_id, "user_id": user_id},
             },
-            "capture": True,
-            "description": f"Оплата заказа №{order_id}",
-            "metadata": {"order_id": order_id, "user_id": user_id},
-        },
-        idempotence_key,
-    )
-
-    return payment
+            idempotence_key=idempotence_key,
+        )
+
+        return PaymentResponse(data)
+
+    async def get_payment(self, payment_id: str) -> PaymentResponse:
+        """Получение платежа."""
+
+        return PaymentResponse(await self._request("GET", f"/payments/{payment_id}"))
+
+
+yookassa_client = YooKassaClient(YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)
+
+
+async def create_yookassa_payment(order_id: int, user_id: int, total_price: float):
+    """Создание платежа в Юкасса."""
+
+    return await yookassa_client.create_payment(order_id, user_id, total_price)
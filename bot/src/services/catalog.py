@@ -0,0 +1,35 @@
+import os
+
+from bot.src.services.cache import TTLCache
+
+# канал PostgreSQL, в который админ-панель сообщает об изменении каталога
+CATALOG_CHANNEL = "catalog_changed"
+
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 300))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 1024))
+
+# результаты инлайн-поиска товаров (запрос на каждое нажатие клавиши) хранятся отдельно,
+# чтобы не вытеснять из catalog_cache категории и списки товаров
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 60))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+_catalog_version = 0
+
+
+def get_catalog_version() -> int:
+    """Версия каталога, увеличивается при каждой инвалидации кэша."""
+
+    return _catalog_version
+
+
+def invalidate_catalog(*args):
+    """Сбрасывает кэш каталога. Подходит как обработчик уведомлений asyncpg."""
+
+    global _catalog_version
+
+    catalog_cache.clear()
+    search_cache.clear()
+    _catalog_version += 1
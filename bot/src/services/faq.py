@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from bot.src.keyboards.main_menu import get_faq_keyboard
+from bot.src.services.cache import TTLCache
+from bot.src.services.catalog import CATALOG_CACHE_TTL, get_catalog_version
+from bot.src.services.llm_cache import normalize_prompt
+from bot.src.services.repository import get_faqs
+
+# сколько секунд Telegram может показывать сохраненный ответ на тот же инлайн-запрос
+FAQ_INLINE_CACHE_TIME = int(os.getenv("FAQ_INLINE_CACHE_TIME", 300))
+FAQ_QUERY_CACHE_SIZE = int(os.getenv("FAQ_QUERY_CACHE_SIZE", 1024))
+# Telegram принимает не больше 50 результатов на инлайн-запрос
+FAQ_MAX_RESULTS = 50
+
+# окончания, от длинных к коротким
+_ENDINGS = sorted(
+    (
+        "иями", "ями", "ами", "иях", "ях", "ах", "ов", "ев", "ей", "ий", "ый", "ой", "ая", "яя", "ое", "ее",
+        "ые", "ие", "ых", "их", "ым", "им", "ом", "ем", "ам", "ям", "ую", "юю", "ию", "ия", "ии", "ться",
+        "тся", "ить", "ать", "ять", "еть", "ть", "ешь", "ла", "ло", "ли", "а", "я", "о", "е", "ы", "и", "у",
+        "ю", "ь",
+    ),
+    key=len,
+    reverse=True,
+)
+_MIN_STEM = 3
+
+_STOPWORDS = {
+    "а", "в", "во", "вы", "вас", "ваш", "где", "да", "для", "до", "есть", "же", "и", "из", "или", "как",
+    "какой", "когда", "ли", "мне", "можно", "на", "не", "о", "об", "от", "по", "с", "со", "у", "что", "это", "я",
+}
+
+# вес совпадения в вопросе и в ответе
+_QUESTION_WEIGHT = 2
+_ANSWER_WEIGHT = 1
+# множители для точного совпадения основы, совпадения по началу слова и нечеткого совпадения
+_EXACT, _PREFIX, _FUZZY = 1.0, 0.8, 0.5
+# сходство триграмм для нечеткого совпадения, как pg_trgm.similarity_threshold по умолчанию
+_FUZZY_CUTOFF = 0.3
+# доля значимых слов сообщения, которые должны найтись в одном вопросе FAQ, чтобы ответить из FAQ без LLM
+FAQ_ANSWER_COVERAGE = 0.75
+
+
+def stem(word: str) -> str:
+    """Упрощенный стеммер: отрезает самое длинное окончание, оставляя основу не короче трех букв."""
+
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Основы значимых слов текста."""
+
+    return [stem(word) for word in normalize_prompt(text).split() if word not in _STOPWORDS]
+
+
+def trigrams(word: str) -> set:
+    """Триграммы слова, дополненного пробелами, как в pg_trgm: два в начале и один в конце."""
+
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FaqIndex:
+    """Индекс FAQ, строится один раз на версию данных.
+
+    Инвертированный индекс по основам слов, отсортированный список основ для поиска по началу слова,
+    которое пользователь еще набирает, и триграммы для опечаток. Результаты инлайн-запросов
+    создаются заранее, поиск только выбирает готовые объекты.
+    """
+
+    def __init__(self, entries: list, keyboard, version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = entries
+
+        self._postings = defaultdict(dict)
+        for position, entry in enumerate(entries):
+            for weight, text in ((_ANSWER_WEIGHT, entry["answer"]), (_QUESTION_WEIGHT, entry["question"])):
+                for token in tokenize(text):
+                    postings = self._postings[token]
+                    postings[position] = max(postings.get(position, 0), weight)
+
+        self._stems = sorted(self._postings)
+        self._trigrams = defaultdict(set)
+        for token in self._stems:
+            for trigram in trigrams(token):
+                self._trigrams[trigram].add(token)
+
+        self._results = [
+            InlineQueryResultArticle(
+                id=str(entry["id"]),
+                title=entry["question"].capitalize(),
+                description=entry["answer"][:100],
+                input_message_content=InputTextMessageContent(
+                    message_text=f"<b>{entry['question'].capitalize()}</b>\n\n{entry['answer']}", parse_mode="HTML"
+                ),
+                reply_markup=keyboard,
+            )
+            for entry in entries
+        ]
+        self._queries = TTLCache(maxsize=FAQ_QUERY_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+    def _prefixed(self, token: str) -> list:
+        start = bisect.bisect_left(self._stems, token)
+        end = bisect.bisect_left(self._stems, token + "\uffff")
+        return self._stems[start:end]
+
+    def _fuzzy(self, token: str) -> list:
+        query = trigrams(token)
+        counts = defaultdict(int)
+        for trigram in query:
+            for candidate in self._trigrams.get(trigram, ()):
+                counts[candidate] += 1
+
+        return [
+            candidate
+            for candidate, common in counts.items()
+            if common / (len(query) + len(trigrams(candidate)) - common) >= _FUZZY_CUTOFF
+        ]
+
+    def _match(self, token: str):
+        """Основы из индекса, подходящие под слово запроса, с множителем качества совпадения."""
+
+        if token in self._postings:
+            yield token, _EXACT
+        for candidate in self._prefixed(token):
+            if candidate != token:
+                yield candidate, _PREFIX
+        if token not in self._postings and len(token) >= _MIN_STEM:
+            for candidate in self._fuzzy(token):
+                yield candidate, _FUZZY
+
+    def answer(self, prompt: str) -> Optional[str]:
+        """Ответ FAQ на сообщение, если сообщение по сути и есть вопрос FAQ, иначе None.
+
+        Слова сообщения ищутся среди слов вопросов так же, как при инлайн-поиске. Ответ возвращается,
+        только если в одном вопросе нашлось не меньше FAQ_ANSWER_COVERAGE значимых слов сообщения:
+        "как оплатить" - вопрос об оплате, "сколько стоит доставка в Москву" - уже нет.
+        """
+
+        tokens = tokenize(prompt)
+        if not tokens:
+            return None
+
+        found = defaultdict(int)
+        for token in tokens:
+            positions = {
+                position
+                for candidate, _ in self._match(token)
+                for position, weight in self._postings[candidate].items()
+                if weight == _QUESTION_WEIGHT
+            }
+            for position in positions:
+                found[position] += 1
+
+        if not found:
+            return None
+
+        position = min(found, key=lambda position: (-found[position], position))
+        if found[position] / len(tokens) < FAQ_ANSWER_COVERAGE:
+            return None
+
+        return self.entries[position]["answer"]
+
+    def search(self, query: str) -> list:
+        """Готовые результаты для инлайн-запроса, от более подходящих к менее."""
+
+        key = normalize_prompt(query)
+        results = self._queries.get(key)
+        if results is not None:
+            return results
+
+        if not key:
+            results = self._results[:FAQ_MAX_RESULTS]
+        else:
+            scores = defaultdict(float)
+            for token in tokenize(key):
+                best = {}
+                for candidate, quality in self._match(token):
+                    for position, weight in self._postings[candidate].items():
+                        best[position] = max(best.get(position, 0), weight * quality)
+                for position, score in best.items():
+                    scores[position] += score
+
+            ranked = sorted(scores, key=lambda position: (-scores[position], position))
+            results = [self._results[position] for position in ranked[:FAQ_MAX_RESULTS]]
+
+        self._queries.set(key, results)
+        return results
+
+
+_index = None
+_index_lock = asyncio.Lock()
+
+
+def _is_stale(index) -> bool:
+    return (
+        index is None
+        or index.version != get_catalog_version()
+        or time.monotonic() - index.built_at > CATALOG_CACHE_TTL
+    )
+
+
+async def get_faq_index() -> FaqIndex:
+    """Индекс FAQ, перестраивается после изменения данных в админ-панели или по истечении TTL."""
+
+    global _index
+
+    if _is_stale(_index):
+        async with _index_lock:
+            if _is_stale(_index):
+                version = get_catalog_version()
+                _index = FaqIndex(await get_faqs(), await get_faq_keyboard(), version)
+
+    return _index
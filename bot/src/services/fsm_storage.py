@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.src.middlewares.logging_logs import logger
+from bot.src.services.cache import TTLCache
+from bot.src.services.repository import get_pool
+
+# postgres - таблица app_fsmstate, redis - RedisStorage aiogram (нужен пакет redis),
+# memory - состояния в памяти процесса, для локального запуска и тестов
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+# через сколько секунд без изменений состояние диалога сбрасывается
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 86400))
+# как часто накопленные изменения сохраняются в БД
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 0.05))
+FSM_RETRY_DELAY = 1
+FSM_CLEANUP_INTERVAL = 600
+FSM_CACHE_SIZE = 10000
+FSM_CACHE_TTL = 60
+
+
+def _empty_row() -> dict:
+    return {"state": None, "data": {}}
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище состояний FSM в таблице app_fsmstate.
+
+    Изменения накапливаются и сохраняются одним запросом раз в flush_interval секунд, одновременные чтения
+    разных ключей объединяются в один запрос. Несохраненные изменения видны чтениям этого процесса сразу.
+    """
+
+    def __init__(self, ttl: int = FSM_STATE_TTL, flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        # последние прочитанные записи, чтобы менять state и data по отдельности без лишнего чтения
+        self._rows = TTLCache(maxsize=FSM_CACHE_SIZE, ttl=FSM_CACHE_TTL)
+        self._pending = {}
+        self._flushing = {}
+        self._reads = {}
+        self._read_task = None
+        self._flush_task = None
+        self._last_cleanup = time.monotonic()
+        self._closed = False
+
+    def _local(self, key: str) -> Optional[dict]:
+        """Несохраненная запись ключа."""
+
+        return self._pending.get(key) or self._flushing.get(key)
+
+    async def _read(self, key: str) -> dict:
+        row = self._local(key)
+        if row is not None:
+            return row
+
+        future = self._reads.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._reads[key] = future
+            if len(self._reads) == 1:
+                # чтение начнется на следующей итерации цикла событий и заберет все накопившиеся ключи
+                self._read_task = asyncio.create_task(self._read_batch())
+
+        return await asyncio.shield(future)
+
+    async def _read_batch(self):
+        reads, self._reads = self._reads, {}
+
+        try:
+            pool = await get_pool()
+            records = await pool.fetch(
+                """
+                SELECT key, state, data
+                FROM app_fsmstate
+                WHERE key = ANY($1::varchar[]) AND updated_at > now() - make_interval(secs => $2)
+                """,
+                list(reads),
+                float(self.ttl),
+            )
+        except Exception as e:
+            for future in reads.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        rows = {record["key"]: {"state": record["state"], "data": json.loads(record["data"])} for record in records}
+        for key, future in reads.items():
+            row = self._local(key) or rows.get(key) or _empty_row()
+            self._rows.set(key, row)
+            if not future.done():
+                future.set_result(row)
+
+    async def _write(self, key: str, **changes):
+        row = self._local(key) or self._rows.get(key)
+        if row is None:
+            row = await self._read(key)
+
+        self._pending[key] = {**row, **changes}
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        delay = self.flush_interval
+        while self._pending and not self._closed:
+            await asyncio.sleep(delay)
+            # после ошибки следующая попытка через FSM_RETRY_DELAY
+            delay = self.flush_interval if await self.flush() else FSM_RETRY_DELAY
+
+    async def flush(self) -> bool:
+        """Сохраняет накопленные изменения одним запросом. Возвращает False, если сохранить не удалось."""
+
+        if not self._pending:
+            return True
+
+        rows, self._pending = self._pending, {}
+        self._flushing = rows
+        # пустые состояния (после state.clear()) удаляются, а не хранятся до истечения TTL
+        upsert = {key: row for key, row in rows.items() if row["state"] is not None or row["data"]}
+        delete = [key for key in rows if key not in upsert]
+
+        try:
+            pool = await get_pool()
+            async with pool.acquire() as conn, conn.transaction():
+                if upsert:
+                    await conn.execute(
+                        """
+                        INSERT INTO app_fsmstate (key, state, data, updated_at)
+                        SELECT key, state, data, now()
+                        FROM unnest($1::varchar[], $2::varchar[], $3::jsonb[]) AS t(key, state, data)
+                        ON CONFLICT (key) DO UPDATE
+                        SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                        """,
+                        list(upsert),
+                        [row["state"] for row in upsert.values()],
+                        [json.dumps(row["data"]) for row in upsert.values()],
+                    )
+                if delete:
+                    await conn.execute("DELETE FROM app_fsmstate WHERE key = ANY($1::varchar[])", delete)
+                if time.monotonic() - self._last_cleanup > FSM_CLEANUP_INTERVAL:
+                    await conn.execute(
+                        "DELETE FROM app_fsmstate WHERE updated_at < now() - make_interval(secs => $1)",
+                        float(self.ttl),
+                    )
+                    self._last_cleanup = time.monotonic()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояний FSM: {e}")
+            # более новые изменения, сделанные во время сохранения, важнее
+            self._pending = {**rows, **self._pending}
+            return False
+        finally:
+            self._flushing = {}
+
+        for key, row in rows.items():
+            self._rows.set(key, row)
+
+        return True
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(self.key_builder.build(key), state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._read(self.key_builder.build(key)))["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        # данные хранятся в JSON, ошибка должна возникнуть в обработчике, а не при отложенном сохранении
+        json.dumps(data)
+        await self._write(self.key_builder.build(key), data=data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._read(self.key_builder.build(key)))["data"].copy()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self.flush()
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище состояний FSM, выбранное в FSM_STORAGE."""
+
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+
+    if FSM_STORAGE == "redis":
+        # пакет redis нужен только для этого варианта
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(FSM_REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+
+    return PostgresStorage()
@@ -0,0 +1,57 @@
+import os
+import re
+from typing import Optional
+
+from bot.src.services.cache import TTLCache
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 1000))
+
+
+def normalize_prompt(text: Optional[str]) -> str:
+    """Приводит вопрос к виду, в котором одинаковые по смыслу формулировки совпадают."""
+
+    text = (text or "").lower().replace("ё", "е")
+    return " ".join(re.findall(r"\w+", text))
+
+
+class LLMResponseCache:
+    """Кэш ответов LLM: сначала поиск по FAQ, затем по ранее полученным ответам."""
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.faq_hits = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prompt: Optional[str], faq=None) -> Optional[str]:
+        """Возвращает готовый ответ на вопрос или None, если нужно обращаться к LLM. faq - индекс FAQ (FaqIndex)."""
+
+        key = normalize_prompt(prompt)
+        if not key:
+            return None
+
+        answer = faq.answer(key) if faq is not None else None
+        if answer is not None:
+            self.faq_hits += 1
+            return answer
+
+        answer = self._cache.get(key)
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        self.misses += 1
+        return None
+
+    def set(self, prompt: Optional[str], answer: str):
+        """Сохраняет ответ LLM на вопрос."""
+
+        key = normalize_prompt(prompt)
+        if key and answer:
+            self._cache.set(key, answer)
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов."""
+
+        return {"faq_hits": self.faq_hits, "hits": self.hits, "misses": self.misses, "size": len(self._cache)}
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 5))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 50))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", 1))
+
+
+class UserBusyError(Exception):
+    """У пользователя уже выполняется максимальное количество запросов."""
+
+
+class QueueFullError(Exception):
+    """Очередь запросов заполнена, запрос отклонен."""
+
+
+class LLMScheduler:
+    """Планировщик запросов к LLM: общий лимит одновременных запросов, лимит на пользователя и очередь."""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_per_user: int = LLM_MAX_PER_USER,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._active = 0
+        self._waiters = deque()
+        self._in_flight = defaultdict(int)
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+    def _release(self):
+        """Передает освободившееся место первому в очереди."""
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, on_queued=None):
+        """Занимает место для запроса пользователя.
+
+        Если свободных мест нет, запрос встает в очередь, а on_queued(position) вызывается с позицией в ней.
+        """
+
+        if self._in_flight[user_id] >= self.max_per_user:
+            raise UserBusyError(f"Пользователь {user_id} уже ожидает ответа")
+
+        self._in_flight[user_id] += 1
+        try:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+            else:
+                if len(self._waiters) >= self.max_queue:
+                    raise QueueFullError("Очередь запросов к LLM заполнена")
+
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    if on_queued is not None:
+                        await on_queued(len(self._waiters))
+                    await waiter
+                except BaseException:
+                    if waiter.done() and not waiter.cancelled():
+                        # место уже передали этому запросу, возвращаем его следующему
+                        self._release()
+                    elif waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    raise
+
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            self._in_flight[user_id] -= 1
+            if not self._in_flight[user_id]:
+                del self._in_flight[user_id]
+
+
+llm_scheduler = LLMScheduler()
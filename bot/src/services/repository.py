@@ -0,0 +1,693 @@
+import asyncio
+import os
+import re
+from decimal import Decimal
+
+import asyncpg
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS
+
+from admin_panel.app.models import Cart, CartItem, Delivery, Order, Product, Subcategory, TelegramUser
+from bot.src.django_setup import DB_POOL_MAX_IDLE, DB_POOL_SIZE
+from bot.src.middlewares.logging_logs import logger
+from bot.src.middlewares.metrics import METRICS_ENABLED, log_asyncpg_query
+from bot.src.services.cache import TTLCache
+from bot.src.services.catalog import (
+    CATALOG_CHANNEL,
+    catalog_cache,
+    get_catalog_version,
+    invalidate_catalog,
+    search_cache,
+)
+
+# пользователи, у которых уже есть запись и корзина; после KNOWN_USERS_TTL секунд проверяются снова
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", 100000))
+KNOWN_USERS_TTL = int(os.getenv("KNOWN_USERS_TTL", 3600))
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_known_users = TTLCache(maxsize=KNOWN_USERS_CACHE_SIZE, ttl=KNOWN_USERS_TTL)
+_registrations = {}
+_register_task = None
+
+
+def _connect_kwargs():
+    """Параметры подключения из настроек БД Django."""
+
+    db = settings.DATABASES[DEFAULT_DB_ALIAS]
+
+    return {
+        "host": db["HOST"] or None,
+        "port": db["PORT"] or None,
+        "user": db["USER"],
+        "password": db["PASSWORD"],
+        "database": db["NAME"],
+    }
+
+
+async def _init_connection(conn):
+    if METRICS_ENABLED:
+        conn.add_query_logger(log_asyncpg_query)
+
+
+async def get_pool():
+    """Возвращает пул асинхронных соединений с БД, создавая его при первом обращении."""
+
+    global _pool
+
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    **_connect_kwargs(),
+                    min_size=1,
+                    max_size=DB_POOL_SIZE,
+                    max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+                    init=_init_connection,
+                )
+
+    return _pool
+
+
+async def close_pool():
+    """Закрывает пул соединений с БД."""
+
+    global _pool
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _to_model(model, record):
+    """Собирает экземпляр модели Django из строки результата запроса."""
+
+    data = dict(record)
+    field_names = [field.attname for field in model._meta.concrete_fields if field.attname in data]
+
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [data[name] for name in field_names])
+
+
+async def _get(model, query: str, *args):
+    """Получение одного объекта модели, как objects.get()."""
+
+    pool = await get_pool()
+    record = await pool.fetchrow(query, *args)
+    if record is None:
+        raise model.DoesNotExist(f"{model.__name__} не найден")
+
+    return _to_model(model, record)
+
+
+async def _cached(key, loader, cache: TTLCache = catalog_cache):
+    """Возвращает данные каталога из кэша, загружая их при промахе."""
+
+    value = cache.get(key)
+    if value is None:
+        version = get_catalog_version()
+        value = await loader()
+        # если каталог изменился во время загрузки, данные могли устареть
+        if version == get_catalog_version():
+            cache.set(key, value)
+
+    return value
+
+
+def _paginate(object_list: list, page: int = 1, per_page: int = 5):
+    """Пагинация закэшированного списка."""
+
+    page_obj = Paginator(object_list, per_page).get_page(page)
+
+    return {"page_obj": page_obj, "object_list": list(page_obj.object_list)}
+
+
+async def watch_catalog_changes():
+    """Слушает уведомления админ-панели об изменении каталога и сбрасывает кэш."""
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(**_connect_kwargs())
+            closed = asyncio.Event()
+            conn.add_termination_listener(lambda _: closed.set())
+            await conn.add_listener(CATALOG_CHANNEL, invalidate_catalog)
+            # пока соединения не было, уведомления могли быть пропущены
+            invalidate_catalog()
+            await closed.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка подписки на изменения каталога: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+        await asyncio.sleep(5)
+
+
+async def register_user(user_id: int):
+    """Регистрирует пользователя и создает ему корзину.
+
+    Пользователи, зарегистрированные этим процессом, запоминаются, повторный /start не обращается к БД.
+    Одновременные регистрации разных пользователей объединяются в один запрос.
+    """
+
+    global _register_task
+
+    if user_id in _known_users:
+        return
+
+    future = _registrations.get(user_id)
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        _registrations[user_id] = future
+        if len(_registrations) == 1:
+            # регистрация начнется на следующей итерации цикла событий и заберет всех накопившихся пользователей
+            _register_task = asyncio.create_task(_register_batch())
+
+    await asyncio.shield(future)
+
+
+async def _register_batch():
+    registrations = dict(_registrations)
+    _registrations.clear()
+    user_ids = list(registrations)
+
+    try:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            # для уже зарегистрированных пользователей оба запроса ничего не записывают
+            await conn.execute(
+                "INSERT INTO app_telegramuser (user_id, created_at) SELECT user_id, now() "
+                "FROM unnest($1::bigint[]) AS t(user_id) ON CONFLICT (user_id) DO NOTHING",
+                user_ids,
+            )
+            # отдельный запрос видит и пользователей, одновременно созданных другими процессами
+            await conn.execute(
+                "INSERT INTO app_cart (user_id, created_at) SELECT id, now() FROM app_telegramuser "
+                "WHERE user_id = ANY($1::bigint[]) ON CONFLICT (user_id) DO NOTHING",
+                user_ids,
+            )
+    except Exception as e:
+        for future in registrations.values():
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    for user_id, future in registrations.items():
+        _known_users.set(user_id, True)
+        if not future.done():
+            future.set_result(None)
+
+
+async def get_categories_page(page: int = 1, per_page: int = 5):
+    """Получение категорий с пагинацией."""
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch("SELECT id, title FROM app_category WHERE is_active ORDER BY id")
+        return [dict(record) for record in records]
+
+    return _paginate(await _cached(("categories",), load), page=page, per_page=per_page)
+
+
+async def get_subcategories_page(category_id: int, page: int = 1, per_page: int = 5):
+    """Получение подкатегорий с пагинацией."""
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch(
+            "SELECT id, title FROM app_subcategory WHERE is_active AND category_id = $1 ORDER BY id", category_id
+        )
+        return [dict(record) for record in records]
+
+    return _paginate(await _cached(("subcategories", category_id), load), page=page, per_page=per_page)
+
+
+async def get_subcategory(subcategory_id: int):
+    """Получение подкатегории"""
+
+    return await _cached(
+        ("subcategory", subcategory_id),
+        lambda: _get(Subcategory, "SELECT * FROM app_subcategory WHERE id = $1", subcategory_id),
+    )
+
+
+async def get_products_subcategory(subcategory_id: int):
+    """Получение товаров с изображениями"""
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch(
+            "SELECT * FROM app_product WHERE subcategory_id = $1 AND is_active ORDER BY id", subcategory_id
+        )
+        return [_to_model(Product, record) for record in records]
+
+    return await _cached(("products", subcategory_id), load)
+
+
+async def get_products_page(subcategory_id: int, page: int = 1, per_page: int = 5):
+    """Получение товаров подкатегории с пагинацией."""
+
+    return _paginate(await get_products_subcategory(subcategory_id), page=page, per_page=per_page)
+
+
+def _prefix_tsquery(text: str) -> str:
+    """Запрос полнотекстового поиска, в котором последнее слово может быть набрано не полностью."""
+
+    return " & ".join(f"{word}:*" for word in re.findall(r"[^\W_]+", text.lower()))
+
+
+async def search_products(text: str, offset: int = 0, limit: int = 20):
+    """Поиск активных товаров по названию и описанию.
+
+    Использует индексы app_product_search_idx (полнотекстовый) и app_product_title_trgm_idx (опечатки в названии).
+    """
+
+    query = _prefix_tsquery(text)
+    title = " ".join(text.lower().split())
+    if not query:
+        return {"products": [], "next_offset": None}
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch(
+            """
+            SELECT p.*
+            FROM app_product p
+            JOIN app_subcategory s ON s.id = p.subcategory_id
+            JOIN app_category c ON c.id = s.category_id
+            WHERE p.is_active AND s.is_active AND c.is_active
+                AND (
+                    to_tsvector('russian', p.title || ' ' || coalesce(p.description, ''))
+                        @@ to_tsquery('russian', $1)
+                    OR p.title % $2
+                )
+            ORDER BY
+                ts_rank(
+                    to_tsvector('russian', p.title || ' ' || coalesce(p.description, '')), to_tsquery('russian', $1)
+                ) DESC,
+                similarity(p.title, $2) DESC,
+                p.id
+            LIMIT $3 OFFSET $4
+            """,
+            query,
+            title,
+            limit + 1,
+            offset,
+        )
+        products = [_to_model(Product, record) for record in records[:limit]]
+        # лишняя строка показывает, что есть следующая страница
+        next_offset = offset + limit if len(records) > limit else None
+
+        return {"products": products, "next_offset": next_offset}
+
+    return await _cached((title, offset, limit), load, search_cache)
+
+
+async def get_new_products(offset: int = 0, limit: int = 20):
+    """Последние добавленные активные товары, для инлайн-поиска без текста."""
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch(
+            """
+            SELECT p.*
+            FROM app_product p
+            JOIN app_subcategory s ON s.id = p.subcategory_id
+            JOIN app_category c ON c.id = s.category_id
+            WHERE p.is_active AND s.is_active AND c.is_active
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT $1 OFFSET $2
+            """,
+            limit + 1,
+            offset,
+        )
+        products = [_to_model(Product, record) for record in records[:limit]]
+        next_offset = offset + limit if len(records) > limit else None
+
+        return {"products": products, "next_offset": next_offset}
+
+    return await _cached(("new_products", offset, limit), load, search_cache)
+
+
+async def get_faqs():
+    """Получение активных вопросов FAQ."""
+
+    async def load():
+        pool = await get_pool()
+        records = await pool.fetch("SELECT id, question, answer FROM app_faq WHERE is_active ORDER BY id")
+        return [dict(record) for record in records]
+
+    return await _cached(("faq",), load)
+
+
+async def get_or_create_cart(user_id: int):
+    """Получить или создать корзину."""
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        query = "SELECT c.* FROM app_cart c JOIN app_telegramuser u ON u.id = c.user_id WHERE u.user_id = $1"
+        record = await conn.fetchrow(query, user_id)
+        if record is None:
+            record = await conn.fetchrow(
+                "INSERT INTO app_cart (user_id, created_at) SELECT id, now() FROM app_telegramuser "
+                "WHERE user_id = $1 ON CONFLICT (user_id) DO NOTHING RETURNING *",
+                user_id,
+            ) or await conn.fetchrow(query, user_id)
+
+    if record is None:
+        raise TelegramUser.DoesNotExist(f"Пользователь {user_id} не найден")
+
+    return _to_model(Cart, record)
+
+
+async def get_or_create_cart_item(cart: Cart, product: Product, quantity: int):
+    """Получить или создать содержимое корзины."""
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        record = await conn.fetchrow(
+            "UPDATE app_cartitem SET quantity = $3 WHERE cart_id = $1 AND product_id = $2 RETURNING *",
+            cart.id,
+            product.id,
+            quantity,
+        ) or await conn.fetchrow(
+            "INSERT INTO app_cartitem (cart_id, product_id, quantity) VALUES ($1, $2, $3) RETURNING *",
+            cart.id,
+            product.id,
+            quantity,
+        )
+
+    return _to_model(CartItem, record)
+
+
+async def get_product(product_id: int):
+    """Получение товара."""
+
+    return await _get(Product, "SELECT * FROM app_product WHERE id = $1", product_id)
+
+
+async def save_product_image_file_id(product_id: int, image: str, file_id: str):
+    """Сохраняет file_id загруженного в Telegram фото товара, если изображение не успели заменить."""
+
+    pool = await get_pool()
+    await pool.execute(
+        "UPDATE app_product SET image_file_id = $3 WHERE id = $1 AND image = $2", product_id, image, file_id
+    )
+
+
+async def get_user_telegram(user_id: int):
+    """Получаем пользователя."""
+
+    return await _get(TelegramUser, "SELECT * FROM app_telegramuser WHERE user_id = $1", user_id)
+
+
+async def delete_product_cart_item(cart_item_id: int):
+    """Удаление товара из содержимого корзины."""
+
+    pool = await get_pool()
+    await pool.execute("DELETE FROM app_cartitem WHERE id = $1", cart_item_id)
+
+
+async def delete_all_cart_item(cart_id: int):
+    """Удалить все товары из корзины."""
+
+    pool = await get_pool()
+    await pool.execute("DELETE FROM app_cartitem WHERE cart_id = $1", cart_id)
+
+
+async def create_an_order(user_id: int, total_price: float):
+    """Создать заказ."""
+
+    return await _get(
+        Order,
+        "INSERT INTO app_order (user_id, status, status_payment, total_price, created_at, updated_at) "
+        "SELECT id, 'new', 'not_paid', $2, now(), now() FROM app_telegramuser WHERE user_id = $1 RETURNING *",
+        user_id,
+        Decimal(str(total_price)),
+    )
+
+
+async def save_order_delivery(order_id: int, address: str, phone: str, comment: str, delivery_date):
+    """Сохранение доставки."""
+
+    return await _get(
+        Delivery,
+        "INSERT INTO app_delivery (order_id, address, phone, comment, delivery_date) "
+        "VALUES ($1, $2, $3, $4, $5) RETURNING *",
+        order_id,
+        address,
+        phone,
+        comment,
+        delivery_date,
+    )
+
+
+async def update_order_status(order_id: int, status: str):
+    """Обновление статуса заказа."""
+
+    return await _get(
+        Order, "UPDATE app_order SET status = $2, updated_at = now() WHERE id = $1 RETURNING *", order_id, status
+    )
+
+
+async def get_cart_items_for_user(user_id: int):
+    """Получить содержимое корзины по ид пользователя вместе с товарами и итоговой суммой одним запросом."""
+
+    pool = await get_pool()
+    records = await pool.fetch(
+        "SELECT c.id AS cart_id, ci.id AS cart_item_id, ci.quantity, ci.quantity * p.price AS subtotal, "
+        "sum(ci.quantity * p.price) OVER () AS total, p.* FROM app_cartitem ci "
+        "JOIN app_cart c ON c.id = ci.cart_id JOIN app_telegramuser u ON u.id = c.user_id "
+        "JOIN app_product p ON p.id = ci.product_id WHERE u.user_id = $1 ORDER BY ci.id",
+        user_id,
+    )
+
+    return {
+        "cart_id": records[0]["cart_id"] if records else None,
+        "items": [
+            {
+                "cart_item_id": record["cart_item_id"],
+                "product_id": record["id"],
+                "title": record["title"],
+                "price": record["price"],
+                "quantity": record["quantity"],
+                "subtotal": record["subtotal"],
+                "product": _to_model(Product, record),
+            }
+            for record in records
+        ],
+        "total": records[0]["total"] if records else Decimal("0"),
+    }
+
+
+async def checkout_order(order_id: int, user_id: int, address: str, phone: str, comment: str, delivery_date):
+    """Оформляет заказ одной транзакцией: доставка, товары заказа, списание остатков, очистка корзины и статус.
+
+    Если корзина пуста или каких-то товаров не хватает, заказ отменяется, а остатки и корзина не меняются.
+    Возвращает None, если заказ уже оформлен или отменен (например, повторным нажатием кнопки).
+    """
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # параллельное оформление того же заказа ждет здесь и видит уже измененный статус
+            status = await conn.fetchval("SELECT status FROM app_order WHERE id = $1 FOR UPDATE", order_id)
+            if status != "new":
+                return None
+
+            # блокируем товары в порядке id, чтобы параллельные заказы не взаимоблокировались
+            records = await conn.fetch(
+                "SELECT c.id AS cart_id, ci.id AS cart_item_id, ci.quantity, p.id AS product_id, p.title, p.price, "
+                "p.stock FROM app_cartitem ci JOIN app_cart c ON c.id = ci.cart_id "
+                "JOIN app_telegramuser u ON u.id = c.user_id JOIN app_product p ON p.id = ci.product_id "
+                "WHERE u.user_id = $1 ORDER BY p.id, ci.id FOR UPDATE OF p",
+                user_id,
+            )
+
+            quantities = {}
+            for record in records:
+                quantities[record["product_id"]] = quantities.get(record["product_id"], 0) + record["quantity"]
+
+            stocks = {record["product_id"]: record for record in records}
+            failed = [
+                {
+                    "product_id": product_id,
+                    "title": stocks[product_id]["title"],
+                    "quantity": quantity,
+                    "stock": stocks[product_id]["stock"],
+                }
+                for product_id, quantity in quantities.items()
+                if stocks[product_id]["stock"] < quantity
+            ]
+
+            checkout = {
+                "cart_id": records[0]["cart_id"] if records else None,
+                "items": [
+                    {
+                        "cart_item_id": record["cart_item_id"],
+                        "product_id": record["product_id"],
+                        "title": record["title"],
+                        "price": record["price"],
+                        "quantity": record["quantity"],
+                    }
+                    for record in records
+                ],
+                "quantities": quantities,
+                "total": sum((record["price"] * record["quantity"] for record in records), Decimal("0")),
+                "failed": failed,
+            }
+
+            if not records or failed:
+                await conn.execute(
+                    "UPDATE app_order SET status = 'cancelled', updated_at = now() WHERE id = $1", order_id
+                )
+                return checkout
+
+            await conn.execute(
+                "WITH stock AS (UPDATE app_product p SET stock = p.stock - r.quantity, updated_at = now() "
+                "FROM unnest($2::bigint[], $3::int[]) AS r(id, quantity) WHERE p.id = r.id), "
+                "delivery AS (INSERT INTO app_delivery (order_id, address, phone, comment, delivery_date) "
+                "VALUES ($1, $4, $5, $6, $7)), "
+                "cart AS (DELETE FROM app_cartitem WHERE id = ANY($8::bigint[])), "
+                "items AS (INSERT INTO app_orderitem (order_id, product_id, title, price, quantity) "
+                "SELECT $1, * FROM unnest($10::bigint[], $11::text[], $12::numeric[], $13::int[])) "
+                "UPDATE app_order SET status = 'processing', total_price = $9, updated_at = now() WHERE id = $1",
+                order_id,
+                list(quantities),
+                list(quantities.values()),
+                address,
+                phone,
+                comment,
+                delivery_date,
+                [record["cart_item_id"] for record in records],
+                checkout["total"],
+                [record["product_id"] for record in records],
+                [record["title"] for record in records],
+                [record["price"] for record in records],
+                [record["quantity"] for record in records],
+            )
+
+    return checkout
+
+
+async def cancel_order(order_id: int, checkout: dict):
+    """Отменяет оформленный заказ, возвращая товары на остаток и в корзину.
+
+    Заказ не в статусе processing (например, уже отмененный) не меняется, товары повторно не возвращаются.
+    """
+
+    pool = await get_pool()
+    await pool.execute(
+        "WITH cancelled AS (UPDATE app_order SET status = 'cancelled', updated_at = now() "
+        "WHERE id = $1 AND status = 'processing' RETURNING id), "
+        "stock AS (UPDATE app_product p SET stock = p.stock + r.quantity, updated_at = now() "
+        "FROM unnest($2::bigint[], $3::int[]) AS r(id, quantity), cancelled WHERE p.id = r.id) "
+        "INSERT INTO app_cartitem (cart_id, product_id, quantity) "
+        "SELECT $4, i.product_id, i.quantity "
+        "FROM unnest($5::bigint[], $6::int[]) AS i(product_id, quantity), cancelled",
+        order_id,
+        list(checkout["quantities"]),
+        list(checkout["quantities"].values()),
+        checkout["cart_id"],
+        [item["product_id"] for item in checkout["items"]],
+        [item["quantity"] for item in checkout["items"]],
+    )
+
+
+async def delete_cart_item(user_id: int):
+    """Удаляем содержимое корзины по ид пользователя."""
+
+    pool = await get_pool()
+    await pool.execute(
+        "DELETE FROM app_cartitem WHERE cart_id IN "
+        "(SELECT c.id FROM app_cart c JOIN app_telegramuser u ON u.id = c.user_id WHERE u.user_id = $1)",
+        user_id,
+    )
+
+
+async def save_order_payment(order_id: int, payment_id: str):
+    """Сохранение ID платежа заказа."""
+
+    pool = await get_pool()
+    await pool.execute("UPDATE app_order SET payment_id = $2, updated_at = now() WHERE id = $1", order_id, payment_id)
+
+
+async def update_order_status_payment(order_id: int):
+    """Обновление статуса оплаты заказа."""
+
+    pool = await get_pool()
+    await pool.execute("UPDATE app_order SET status_payment = 'paid', updated_at = now() WHERE id = $1", order_id)
+
+
+async def apply_payment_events(events: list):
+    """Применяет события оплаты из уведомлений ЮКассы одним запросом.
+
+    events - список (order_id, payment_id, event), event - payment.succeeded или payment.canceled.
+    Изменяются только заказы с тем же payment_id и еще не переведенные в этот статус, поэтому повторное
+    уведомление ничего не меняет. При отмене платежа товары возвращаются на склад. Если в пакете для заказа
+    есть и оплата, и отмена, применяется только оплата.
+    Возвращает измененные заказы с Telegram ID пользователей для уведомлений.
+    """
+
+    pool = await get_pool()
+    records = await pool.fetch(
+        """
+        WITH events AS (
+            SELECT * FROM unnest($1::bigint[], $2::varchar[], $3::varchar[]) AS e(order_id, payment_id, event)
+        ),
+        paid AS (
+            UPDATE app_order o SET status_payment = 'paid', updated_at = now()
+            FROM events e
+            WHERE e.event = 'payment.succeeded' AND o.id = e.order_id AND o.payment_id = e.payment_id
+                AND o.status_payment <> 'paid'
+            RETURNING o.id, o.user_id, e.event
+        ),
+        canceled AS (
+            UPDATE app_order o SET status = 'cancelled', updated_at = now()
+            FROM events e
+            WHERE e.event = 'payment.canceled' AND o.id = e.order_id AND o.payment_id = e.payment_id
+                AND o.status_payment = 'not_paid' AND o.status <> 'cancelled'
+                -- оба UPDATE видят заказ до изменений: деньги списаны, отмену того же платежа не применяем
+                AND NOT EXISTS (
+                    SELECT 1 FROM events s
+                    WHERE s.event = 'payment.succeeded' AND s.order_id = o.id AND s.payment_id = o.payment_id
+                )
+            RETURNING o.id, o.user_id, e.event
+        ),
+        restock AS (
+            UPDATE app_product p SET stock = p.stock + r.quantity, updated_at = now()
+            FROM (
+                SELECT oi.product_id, sum(oi.quantity) AS quantity
+                FROM app_orderitem oi
+                JOIN canceled c ON c.id = oi.order_id
+                WHERE oi.product_id IS NOT NULL
+                GROUP BY oi.product_id
+            ) r
+            WHERE p.id = r.product_id
+        ),
+        changed AS (
+            SELECT * FROM paid
+            UNION ALL
+            SELECT * FROM canceled
+        )
+        SELECT c.id AS order_id, u.user_id AS telegram_id, c.event
+        FROM changed c
+        JOIN app_telegramuser u ON u.id = c.user_id
+        """,
+        [order_id for order_id, _, _ in events],
+        [payment_id for _, payment_id, _ in events],
+        [event for _, _, event in events],
+    )
+
+    return [dict(record) for record in records]
+
+
+async def get_order_status_payment(order_id: int):
+    """Получение статуса оплаты заказа."""
+
+    pool = await get_pool()
+
+    return await pool.fetchval("SELECT status_payment FROM app_order WHERE id = $1", order_id)
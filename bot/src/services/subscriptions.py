@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+from aiogram import Bot
+from aiogram.types import ChatMemberUpdated
+
+from bot.src.middlewares.logging_logs import logger
+from bot.src.services.cache import TTLCache
+
+# сколько секунд помнить, что пользователь подписан / не подписан на канал
+SUBSCRIPTION_CACHE_TTL = int(os.getenv("SUBSCRIPTION_CACHE_TTL", 300))
+# короткий срок, чтобы подписавшийся пользователь не ждал долго, если обновление chat_member не пришло
+SUBSCRIPTION_NEGATIVE_TTL = int(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", 10))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", 100000))
+
+SUBSCRIBED_STATUSES = ("member", "administrator", "creator")
+
+
+class SubscriptionCache:
+    """Кэш подписок пользователей на канал.
+
+    Положительный и отрицательный ответы get_chat_member хранятся с разным временем жизни, одновременные
+    проверки одного пользователя объединяются в один запрос. Обновления chat_member канала (бот должен быть
+    администратором канала) сразу меняют запись. Ошибки проверки не кэшируются.
+    """
+
+    def __init__(
+        self,
+        channel,
+        ttl: int = SUBSCRIPTION_CACHE_TTL,
+        negative_ttl: int = SUBSCRIPTION_NEGATIVE_TTL,
+        maxsize: int = SUBSCRIPTION_CACHE_SIZE,
+    ):
+        self.channel = channel
+        self._subscribed = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._not_subscribed = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self._checks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        """Закэшированный статус подписки или None."""
+
+        if user_id in self._subscribed:
+            return True
+        if user_id in self._not_subscribed:
+            return False
+
+        return None
+
+    def set(self, user_id: int, subscribed: bool):
+        if subscribed:
+            self._not_subscribed.pop(user_id)
+            self._subscribed.set(user_id, True)
+        else:
+            self._subscribed.pop(user_id)
+            self._not_subscribed.set(user_id, True)
+
+    async def is_subscribed(self, bot: Bot, user_id: int, refresh: bool = False) -> bool:
+        """Проверяет подписку, обращаясь к Bot API только при промахе кэша.
+
+        refresh=True - для явной проверки пользователем (кнопка "Проверить подписку"): закэшированный отказ
+        не используется, пользователь мог подписаться только что.
+        """
+
+        if refresh:
+            self._not_subscribed.pop(user_id)
+
+        subscribed = self.get(user_id)
+        if subscribed is not None:
+            self.hits += 1
+            return subscribed
+
+        task = self._checks.get(user_id)
+        if task is None:
+            self.misses += 1
+            task = self._checks[user_id] = asyncio.create_task(self._check(bot, user_id))
+            task.add_done_callback(lambda _: self._checks.pop(user_id, None))
+
+        return await asyncio.shield(task)
+
+    async def _check(self, bot: Bot, user_id: int) -> bool:
+        try:
+            member = await bot.get_chat_member(self.channel, user_id)
+        except Exception as e:
+            logger.error(f"Ошибка проверки подписки: {e}")
+            return False
+
+        subscribed = member.status in SUBSCRIBED_STATUSES
+        self.set(user_id, subscribed)
+
+        return subscribed
+
+    def is_channel(self, chat) -> bool:
+        """CHANNEL_ID может быть числовым id или @username канала."""
+
+        channel = str(self.channel)
+        return str(chat.id) == channel or (chat.username is not None and f"@{chat.username}" == channel)
+
+    def update(self, event: ChatMemberUpdated) -> bool:
+        """Обновляет запись по обновлению chat_member. Возвращает False для других чатов."""
+
+        if not self.is_channel(event.chat):
+            return False
+
+        self.set(event.new_chat_member.user.id, event.new_chat_member.status in SUBSCRIBED_STATUSES)
+
+        return True
+
+    def stats(self) -> dict:
+        """Счетчики кэша подписок."""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "subscribed": len(self._subscribed),
+            "not_subscribed": len(self._not_subscribed),
+        }
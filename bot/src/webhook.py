@@ -0,0 +1,151 @@
+import asyncio
+import os
+import secrets
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from bot.src.middlewares.logging_logs import logger
+
+# публичный адрес, на который Telegram отправляет обновления, например https://bot.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# секрет, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+# containerPort из amvera.yml
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 80))
+# сколько секунд при остановке ждать обработки уже принятых обновлений
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 30))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """Прием обновлений от Telegram.
+
+    Ответ 200 отправляется сразу, обновление обрабатывается в фоновой задаче process(data). При остановке
+    новые обновления отклоняются (Telegram повторит их позже), а принятые дорабатываются.
+    """
+
+    def __init__(self, process, secret_token: str):
+        self.process = process
+        self.secret_token = secret_token
+        self.accepting = True
+        self._tasks = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            return web.Response(status=401)
+
+        if not self.accepting:
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+        except Exception as e:
+            logger.error(f"Некорректное обновление от Telegram: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return web.Response()
+
+    async def _process(self, data: dict):
+        try:
+            await self.process(data)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {data.get('update_id')}: {e}")
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Перестает принимать обновления и ждет завершения принятых."""
+
+        self.accepting = False
+        if not self._tasks:
+            return
+
+        logger.info(f"Ожидание обработки {len(self._tasks)} обновлений")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"Не дождались обработки {len(pending)} обновлений, задачи отменены")
+            for task in pending:
+                task.cancel()
+
+
+def stop_event() -> asyncio.Event:
+    """Событие, которое срабатывает по SIGTERM/SIGINT."""
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    return stop
+
+
+async def start_server(setup_app, port: int = WEBHOOK_PORT) -> web.AppRunner:
+    """Запускает HTTP-сервер бота на WEBHOOK_HOST:port, setup_app(app) добавляет обработчики."""
+
+    app = web.Application()
+    setup_app(app)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, port).start()
+
+    return runner
+
+
+async def serve_webhook(bot: Bot, process, allowed_updates: list, drop_pending_updates: bool = False, setup_app=None):
+    """Принимает обновления по вебхуку до SIGTERM/SIGINT и передает их в process(data).
+
+    setup_app(app) добавляет на тот же сервер другие обработчики, например уведомления ЮКассы.
+    """
+
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима вебхука нужны WEBHOOK_URL и WEBHOOK_SECRET")
+
+    handler = WebhookHandler(process, WEBHOOK_SECRET)
+
+    def setup(app: web.Application):
+        app.router.add_post(WEBHOOK_PATH, handler.handle)
+        if setup_app is not None:
+            setup_app(app)
+
+    stop = stop_event()
+    runner = await start_server(setup)
+
+    try:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=drop_pending_updates,
+        )
+        logger.info(f"Запуск бота в режиме вебхука на порту {WEBHOOK_PORT}")
+
+        await stop.wait()
+        logger.info("Остановка бота")
+    finally:
+        # вебхук не удаляется: обновления, пришедшие во время перезапуска, дождутся следующего запуска
+        await handler.drain()
+        await runner.cleanup()
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, drop_pending_updates: bool = False, setup_app=None):
+    """Запускает бота в режиме вебхука и работает до SIGTERM/SIGINT."""
+
+    async def process(data: dict):
+        await dispatcher.feed_raw_update(bot, data)
+
+    workflow_data = {"dispatcher": dispatcher, "bot": bot, **dispatcher.workflow_data}
+    await dispatcher.emit_startup(**workflow_data)
+    try:
+        await serve_webhook(
+            bot, process, dispatcher.resolve_used_update_types(), drop_pending_updates, setup_app=setup_app
+        )
+    finally:
+        await dispatcher.emit_shutdown(**workflow_data)
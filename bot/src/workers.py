@@ -0,0 +1,219 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+from contextlib import suppress
+
+from aiogram import Bot, Dispatcher
+
+from bot.src.middlewares.logging_logs import logger
+from bot.src.webhook import WEBHOOK_DRAIN_TIMEOUT, serve_webhook, start_server, stop_event
+
+# количество процессов-обработчиков, 1 - обновления обрабатываются в основном процессе
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+# сколько обновлений может ждать в очереди одного обработчика
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 1000))
+# сколько обновлений разных чатов обработчик выполняет одновременно
+WORKER_MAX_TASKS = int(os.getenv("WORKER_MAX_TASKS", 100))
+POLLING_TIMEOUT = 10
+SUPERVISOR_CHECK_INTERVAL = 1
+
+# обработчики запускаются заново, а не копируют состояние основного процесса (пулы соединений, цикл событий)
+_mp = multiprocessing.get_context("spawn")
+
+
+def shard_key(data: dict) -> int:
+    """Чат (или пользователь) обновления, все обновления одного чата попадают в один обработчик."""
+
+    for name, event in data.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+
+        # изменение подписки на канал обрабатывается там же, где сообщения пользователя, и обновляет его кэш
+        member = event.get("new_chat_member")
+        if member:
+            return member["user"]["id"]
+
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if event.get("from"):
+            return event["from"]["id"]
+
+    return data.get("update_id", 0)
+
+
+async def run_worker(dispatcher: Dispatcher, bot: Bot, updates, worker_id: int):
+    """Цикл процесса-обработчика.
+
+    Обновления разных чатов обрабатываются параллельно, обновления одного чата - по очереди, в порядке получения.
+    None в очереди - сигнал завершения.
+    """
+
+    workflow_data = {"dispatcher": dispatcher, "bot": bot, "worker_id": worker_id, **dispatcher.workflow_data}
+    await dispatcher.emit_startup(**workflow_data)
+
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(WORKER_MAX_TASKS)
+    # последняя задача каждого чата, следующая задача чата ждет ее завершения
+    chains = {}
+
+    async def process(previous, data: dict):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await dispatcher.feed_raw_update(bot, data, worker_id=worker_id)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {data.get('update_id')} в обработчике {worker_id}: {e}")
+        finally:
+            limit.release()
+
+    def forget(key, task):
+        if chains.get(key) is task:
+            del chains[key]
+
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+
+            await limit.acquire()
+            key = shard_key(data)
+            task = asyncio.create_task(process(chains.get(key), data))
+            chains[key] = task
+            task.add_done_callback(lambda done, key=key: forget(key, done))
+
+        if chains:
+            await asyncio.wait(list(chains.values()))
+    finally:
+        await dispatcher.emit_shutdown(**workflow_data)
+        await bot.session.close()
+
+
+class Supervisor:
+    """Запускает процессы-обработчики, раздает им обновления по чатам и перезапускает упавшие."""
+
+    def __init__(self, target, workers: int = BOT_WORKERS):
+        # target(worker_id, updates) - функция верхнего уровня, которая запускает run_worker в новом процессе
+        self.target = target
+        self.queues = [_mp.Queue(WORKER_QUEUE_SIZE) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.stopping = False
+
+    def _start(self, worker_id: int):
+        process = _mp.Process(
+            target=self.target, args=(worker_id, self.queues[worker_id]), name=f"bot-worker-{worker_id}", daemon=True
+        )
+        process.start()
+        self.processes[worker_id] = process
+        logger.info(f"Обработчик {worker_id} запущен, pid {process.pid}")
+
+    def start(self):
+        for worker_id in range(len(self.queues)):
+            self._start(worker_id)
+
+    async def watch(self):
+        """Перезапускает завершившиеся обработчики. Очередь сохраняется, обновления в ней не теряются."""
+
+        while not self.stopping:
+            for worker_id, process in enumerate(self.processes):
+                if not process.is_alive() and not self.stopping:
+                    logger.error(f"Обработчик {worker_id} завершился с кодом {process.exitcode}, перезапуск")
+                    self._start(worker_id)
+            await asyncio.sleep(SUPERVISOR_CHECK_INTERVAL)
+
+    async def dispatch(self, data: dict):
+        """Передает обновление обработчику его чата."""
+
+        updates = self.queues[shard_key(data) % len(self.queues)]
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            # обработчик не успевает, ждем места в очереди, не останавливая цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, updates.put, data)
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Просит обработчики доработать принятые обновления и ждет их завершения."""
+
+        self.stopping = True
+        for updates in self.queues:
+            updates.put(None)
+
+        loop = asyncio.get_running_loop()
+        for worker_id, process in enumerate(self.processes):
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Обработчик {worker_id} не завершился за {timeout} с, остановлен принудительно")
+                process.terminate()
+
+
+async def poll_updates(bot: Bot, process, allowed_updates: list, drop_pending_updates: bool = False):
+    """Long polling в основном процессе до SIGTERM/SIGINT, обновления передаются в process(data)."""
+
+    await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+    stop = stop_event()
+    offset = None
+
+    async def listen():
+        nonlocal offset
+
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=POLLING_TIMEOUT,
+                    allowed_updates=allowed_updates,
+                    request_timeout=int(bot.session.timeout + POLLING_TIMEOUT),
+                )
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                await process(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    task = asyncio.create_task(listen())
+    await stop.wait()
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+async def run_supervisor(
+    target, bot: Bot, allowed_updates: list, webhook: bool, drop_pending_updates: bool = False, setup_app=None
+):
+    """Запускает бота с несколькими процессами-обработчиками.
+
+    setup_app(app) добавляет обработчики HTTP-сервера основного процесса, в режиме long polling сервер
+    запускается только для них.
+    """
+
+    supervisor = Supervisor(target)
+    supervisor.start()
+    watcher = asyncio.create_task(supervisor.watch())
+    logger.info(f"Запуск бота с {len(supervisor.queues)} обработчиками")
+    runner = None
+
+    try:
+        if webhook:
+            await serve_webhook(bot, supervisor.dispatch, allowed_updates, drop_pending_updates, setup_app=setup_app)
+        else:
+            if setup_app is not None:
+                runner = await start_server(setup_app)
+            await poll_updates(bot, supervisor.dispatch, allowed_updates, drop_pending_updates)
+    finally:
+        watcher.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        await supervisor.stop()
+
+
+def ignore_signals():
+    """Обработчики останавливает основной процесс, а не сигналы терминала."""
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "admin_panel"))
+
+# без этих настроек не импортируется bot.src.config.settings
+os.environ.setdefault("TOKEN", "123456:TEST")
+os.environ.setdefault("ADMINS", "1")
+os.environ.setdefault("CHANNEL_ID", "@test_channel")
+
+# тесты с БД запускаются только на отдельной базе TEST_DB_NAME: таблицы в ней очищаются перед каждым тестом,
+# остальные параметры подключения (USER, PASSWORD, HOST, PORT) берутся из окружения, как у бота
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+if TEST_DB_NAME:
+    os.environ["NAME"] = TEST_DB_NAME
+
+from bot.src.django_setup import setup_django  # noqa: E402
+
+setup_django()
+
+from django.core.management import call_command  # noqa: E402
+
+from bot.src.services import repository  # noqa: E402
+from bot.src.services.catalog import catalog_cache, search_cache  # noqa: E402
+
+TABLES = (
+    "app_category",
+    "app_subcategory",
+    "app_product",
+    "app_telegramuser",
+    "app_cart",
+    "app_cartitem",
+    "app_order",
+    "app_orderitem",
+    "app_delivery",
+    "app_faq",
+    "app_fsmstate",
+)
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Один цикл событий на все тесты с БД: пул asyncpg работает только в цикле, в котором создан."""
+
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(repository.close_pool())
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def migrated_db():
+    if not TEST_DB_NAME:
+        pytest.skip("не задана TEST_DB_NAME - отдельная база для тестов с БД")
+
+    call_command("migrate", verbosity=0)
+
+
+@pytest.fixture
+def db(migrated_db, loop):
+    """Пустые таблицы бота и кэши. Возвращает функцию, которая выполняет корутину в цикле тестов."""
+
+    async def truncate():
+        pool = await repository.get_pool()
+        await pool.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+    loop.run_until_complete(truncate())
+    catalog_cache.clear()
+    search_cache.clear()
+    repository._known_users.clear()
+
+    return loop.run_until_complete
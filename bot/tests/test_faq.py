@@ -0,0 +1,80 @@
+import pytest
+
+from bot.src.services.faq import FaqIndex
+from bot.src.services.llm_cache import LLMResponseCache
+
+FAQ = {
+    "доставка": "Доставка осуществляется в течение 2-3 рабочих дней.",
+    "оплата": "Мы принимаем карты, электронные кошельки и наличные при самовывозе.",
+    "возврат": "Возврат возможен в течение 14 дней с момента покупки.",
+    "гарантия": "Гарантия на все товары составляет 1 год.",
+    "контакты": "Наши контакты: +7 (123) 456-78-90, email@example.com",
+}
+
+
+@pytest.fixture
+def index():
+    entries = [
+        {"id": position, "question": question, "answer": answer}
+        for position, (question, answer) in enumerate(FAQ.items(), start=1)
+    ]
+    return FaqIndex(entries, None, version=0)
+
+
+@pytest.mark.parametrize(
+    "prompt, question",
+    [
+        ("доставка", "доставка"),
+        ("Доставка?", "доставка"),
+        ("как оплатить", "оплата"),
+        ("Как у вас с оплатой?", "оплата"),
+        ("А возврат?", "возврат"),
+        ("гарнтия", "гарантия"),
+    ],
+)
+def test_answer_faq_topic(index, prompt, question):
+    assert index.answer(prompt) == FAQ[question]
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "сколько стоит доставка в Москву",
+        "посоветуй подарок маме",
+        "",
+        "как",
+    ],
+)
+def test_answer_other_questions_go_to_llm(index, prompt):
+    assert index.answer(prompt) is None
+
+
+def test_llm_cache_prefers_faq(index):
+    cache = LLMResponseCache()
+    cache.set("сколько стоит доставка в Москву", "Доставка по Москве бесплатная.")
+
+    assert cache.get("как оплатить", index) == FAQ["оплата"]
+    assert cache.get("Сколько стоит доставка в Москву?", index) == "Доставка по Москве бесплатная."
+    assert cache.get("посоветуй подарок маме", index) is None
+    assert cache.stats() == {"faq_hits": 1, "hits": 1, "misses": 1, "size": 1}
+
+
+@pytest.mark.parametrize(
+    "query, question",
+    [
+        ("гарнтия", "гарантия"),
+        ("гарантя", "гарантия"),
+        ("доствка", "доставка"),
+        ("оплта", "оплата"),
+        ("вазврат", "возврат"),
+        ("кантакты", "контакты"),
+    ],
+)
+def test_search_typos(index, query, question):
+    results = index.search(query)
+
+    assert results and results[0].title == question.capitalize()
+
+
+def test_search_unrelated_word(index):
+    assert index.search("подарок") == []
@@ -0,0 +1,58 @@
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.src.services.fsm_storage import PostgresStorage
+from bot.src.services.repository import get_pool
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_state_survives_new_storage(db):
+    async def scenario():
+        storage = PostgresStorage()
+        await storage.set_state(KEY, "OrderForm:address")
+        await storage.set_data(KEY, {"address": "Москва", "items": [1, 2]})
+        assert await storage.flush()
+
+        restarted = PostgresStorage()
+        assert await restarted.get_state(KEY) == "OrderForm:address"
+        assert await restarted.get_data(KEY) == {"address": "Москва", "items": [1, 2]}
+
+        await storage.close()
+        await restarted.close()
+
+    db(scenario())
+
+
+def test_close_flushes_pending_writes(db):
+    async def scenario():
+        storage = PostgresStorage()
+        await storage.set_state(KEY, "OrderForm:phone")
+        await storage.set_data(KEY, {"phone": "+79990000000"})
+        await storage.close()
+
+        restarted = PostgresStorage()
+        assert await restarted.get_state(KEY) == "OrderForm:phone"
+        assert await restarted.get_data(KEY) == {"phone": "+79990000000"}
+        await restarted.close()
+
+    db(scenario())
+
+
+def test_cleared_state_is_deleted(db):
+    async def scenario():
+        storage = PostgresStorage()
+        await storage.set_state(KEY, "OrderForm:address")
+        assert await storage.flush()
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+
+        restarted = PostgresStorage()
+        assert await restarted.get_state(KEY) is None
+        assert await restarted.get_data(KEY) == {}
+        await restarted.close()
+
+        pool = await get_pool()
+        assert await pool.fetchval("SELECT count(*) FROM app_fsmstate") == 0
+
+    db(scenario())
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.src.payment_yookassa import notifications
+from bot.src.payment_yookassa.notifications import PaymentNotifications
+from bot.src.services.repository import (
+    apply_payment_events,
+    checkout_order,
+    create_an_order,
+    get_or_create_cart,
+    get_or_create_cart_item,
+    get_pool,
+    get_product,
+    register_user,
+    save_order_payment,
+)
+
+YOOKASSA_IPS = "185.71.76.0/27,77.75.156.11"
+USER_ID = 1001
+
+# событие, которое бот принимает и не применяет к заказам: ответ 200 без запроса к API ЮКассы
+REFUND = {"type": "notification", "event": "refund.succeeded", "object": {"id": "refund-1"}}
+
+
+def post_notification(allowed_ips: str, headers: dict = None) -> int:
+    """Отправляет уведомление с 127.0.0.1, возвращает HTTP-статус ответа."""
+
+    async def main():
+        app = web.Application()
+        PaymentNotifications(allowed_ips).setup(app)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(notifications.YOOKASSA_NOTIFY_PATH, json=REFUND, headers=headers)
+            return response.status
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "trust_proxy, forwarded_for, status",
+    [
+        (False, None, 403),
+        (False, "185.71.76.5", 403),
+        (True, "185.71.76.5", 200),
+        (True, "10.0.0.1, 77.75.156.11", 200),
+        # клиент подставил адрес ЮКассы в начало заголовка, прокси дописал настоящий в конец
+        (True, "185.71.76.5, 10.0.0.1", 403),
+        (True, "not-an-address", 403),
+        (True, None, 403),
+    ],
+)
+def test_sender_address(monkeypatch, trust_proxy, forwarded_for, status):
+    monkeypatch.setattr(notifications, "YOOKASSA_NOTIFY_TRUST_PROXY", trust_proxy)
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else None
+
+    assert post_notification(YOOKASSA_IPS, headers) == status
+
+
+def test_any_sender_allowed_with_star():
+    assert post_notification("*") == 200
+
+
+async def create_paid_orders(count: int) -> tuple:
+    """Оформленные заказы по одному товару в 2 шт. с платежами payment-1, payment-2..."""
+
+    pool = await get_pool()
+    category_id = await pool.fetchval(
+        "INSERT INTO app_category (title, slug, is_active) VALUES ('Чай', 'tea', true) RETURNING id"
+    )
+    subcategory_id = await pool.fetchval(
+        "INSERT INTO app_subcategory (category_id, title, slug, is_active) "
+        "VALUES ($1, 'Зеленый', 'green-tea', true) RETURNING id",
+        category_id,
+    )
+    product_id = await pool.fetchval(
+        "INSERT INTO app_product (subcategory_id, title, slug, price, stock, is_active, created_at, updated_at) "
+        "VALUES ($1, 'Сенча', 'sencha', 100, 10, true, now(), now()) RETURNING id",
+        subcategory_id,
+    )
+
+    await register_user(USER_ID)
+    cart = await get_or_create_cart(USER_ID)
+    order_ids = []
+    for number in range(1, count + 1):
+        await get_or_create_cart_item(cart, await get_product(product_id), 2)
+        order_id = (await create_an_order(USER_ID, 0)).id
+        await checkout_order(order_id, USER_ID, "Москва", "+79990000000", "", None)
+        await save_order_payment(order_id, f"payment-{number}")
+        order_ids.append(order_id)
+
+    return product_id, order_ids
+
+
+async def order_statuses(order_ids: list) -> list:
+    pool = await get_pool()
+    return [
+        tuple(await pool.fetchrow("SELECT status, status_payment FROM app_order WHERE id = $1", order_id))
+        for order_id in order_ids
+    ]
+
+
+def test_apply_payment_events_batch(db):
+    async def scenario():
+        product_id, (first, second, third) = await create_paid_orders(3)
+        events = [
+            (first, "payment-1", "payment.succeeded"),
+            # повторное уведомление в том же пакете
+            (first, "payment-1", "payment.succeeded"),
+            (second, "payment-2", "payment.canceled"),
+            # противоречивые статусы одного платежа: применяется оплата, товары на склад не возвращаются
+            (third, "payment-3", "payment.canceled"),
+            (third, "payment-3", "payment.succeeded"),
+            # неизвестный платеж и платеж, не принадлежащий заказу
+            (999999, "payment-unknown", "payment.succeeded"),
+            (first, "payment-2", "payment.canceled"),
+        ]
+
+        changed = await apply_payment_events(events)
+
+        assert sorted((order["order_id"], order["telegram_id"], order["event"]) for order in changed) == [
+            (first, USER_ID, "payment.succeeded"),
+            (second, USER_ID, "payment.canceled"),
+            (third, USER_ID, "payment.succeeded"),
+        ]
+        assert await order_statuses([first, second, third]) == [
+            ("processing", "paid"),
+            ("cancelled", "not_paid"),
+            ("processing", "paid"),
+        ]
+        pool = await get_pool()
+        # 10 - 3 заказа по 2 шт. + возврат отмененного заказа
+        assert await pool.fetchval("SELECT stock FROM app_product WHERE id = $1", product_id) == 6
+
+        # повторная доставка того же пакета ничего не меняет
+        assert await apply_payment_events(events) == []
+        assert await pool.fetchval("SELECT stock FROM app_product WHERE id = $1", product_id) == 6
+
+    db(scenario())
+
+
+def test_apply_payment_events_unknown_payments(db):
+    async def scenario():
+        _, (order_id,) = await create_paid_orders(1)
+
+        changed = await apply_payment_events(
+            [
+                (order_id + 1, "payment-1", "payment.succeeded"),
+                (order_id, "payment-other", "payment.succeeded"),
+                (order_id, "payment-other", "payment.canceled"),
+            ]
+        )
+
+        assert changed == []
+        assert await order_statuses([order_id]) == [("processing", "not_paid")]
+
+    db(scenario())
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+from bot.src.services.repository import (
+    cancel_order,
+    checkout_order,
+    create_an_order,
+    get_or_create_cart,
+    get_or_create_cart_item,
+    get_pool,
+    get_product,
+    register_user,
+)
+
+USER_ID = 1001
+DELIVERY = {"address": "Москва, ул. Ленина, 1", "phone": "+79990000000", "comment": "", "delivery_date": date.today()}
+
+
+async def create_products(*stocks) -> list:
+    """Товары по 100 руб. с заданными остатками."""
+
+    pool = await get_pool()
+    category_id = await pool.fetchval(
+        "INSERT INTO app_category (title, slug, is_active) VALUES ('Чай', 'tea', true) RETURNING id"
+    )
+    subcategory_id = await pool.fetchval(
+        "INSERT INTO app_subcategory (category_id, title, slug, is_active) "
+        "VALUES ($1, 'Зеленый', 'green-tea', true) RETURNING id",
+        category_id,
+    )
+
+    return [
+        await pool.fetchval(
+            "INSERT INTO app_product (subcategory_id, title, slug, price, stock, is_active, created_at, updated_at) "
+            "VALUES ($1, $2, $3, 100, $4, true, now(), now()) RETURNING id",
+            subcategory_id,
+            f"Товар {number}",
+            f"product-{number}",
+            stock,
+        )
+        for number, stock in enumerate(stocks)
+    ]
+
+
+async def create_order(quantities: dict) -> int:
+    """Корзина пользователя с товарами и новый заказ, как перед нажатием "Подтвердить"."""
+
+    await register_user(USER_ID)
+    cart = await get_or_create_cart(USER_ID)
+    for product_id, quantity in quantities.items():
+        await get_or_create_cart_item(cart, await get_product(product_id), quantity)
+
+    return (await create_an_order(USER_ID, 0)).id
+
+
+async def snapshot(order_id: int, product_ids: list) -> tuple:
+    """Статус заказа, остатки товаров, корзина и число строк заказа."""
+
+    pool = await get_pool()
+    status = await pool.fetchval("SELECT status FROM app_order WHERE id = $1", order_id)
+    stocks = [
+        await pool.fetchval("SELECT stock FROM app_product WHERE id = $1", product_id) for product_id in product_ids
+    ]
+    cart = {
+        record["product_id"]: record["quantity"]
+        for record in await pool.fetch("SELECT product_id, quantity FROM app_cartitem")
+    }
+    items = await pool.fetchval("SELECT count(*) FROM app_orderitem WHERE order_id = $1", order_id)
+
+    return status, stocks, cart, items
+
+
+def test_checkout(db):
+    async def scenario():
+        products = await create_products(5, 3)
+        order_id = await create_order({products[0]: 2, products[1]: 3})
+
+        checkout = await checkout_order(order_id, USER_ID, **DELIVERY)
+
+        assert checkout["failed"] == []
+        assert checkout["total"] == Decimal("500")
+        assert await snapshot(order_id, products) == ("processing", [3, 0], {}, 2)
+
+        pool = await get_pool()
+        assert await pool.fetchval("SELECT total_price FROM app_order WHERE id = $1", order_id) == Decimal("500")
+        assert await pool.fetchval("SELECT address FROM app_delivery WHERE order_id = $1", order_id) == (
+            DELIVERY["address"]
+        )
+
+    db(scenario())
+
+
+def test_checkout_shortage_cancels_order(db):
+    async def scenario():
+        products = await create_products(5, 1)
+        order_id = await create_order({products[0]: 2, products[1]: 3})
+
+        checkout = await checkout_order(order_id, USER_ID, **DELIVERY)
+
+        assert checkout["failed"] == [{"product_id": products[1], "title": "Товар 1", "quantity": 3, "stock": 1}]
+        assert await snapshot(order_id, products) == ("cancelled", [5, 1], {products[0]: 2, products[1]: 3}, 0)
+
+    db(scenario())
+
+
+def test_second_confirm_returns_none(db):
+    async def scenario():
+        products = await create_products(5)
+        order_id = await create_order({products[0]: 2})
+
+        assert await checkout_order(order_id, USER_ID, **DELIVERY) is not None
+        assert await checkout_order(order_id, USER_ID, **DELIVERY) is None
+        assert await snapshot(order_id, products) == ("processing", [3], {}, 1)
+
+    db(scenario())
+
+
+def test_concurrent_confirms_checkout_once(db):
+    async def scenario():
+        products = await create_products(5)
+        order_id = await create_order({products[0]: 2})
+
+        results = await asyncio.gather(*(checkout_order(order_id, USER_ID, **DELIVERY) for _ in range(3)))
+
+        assert sum(result is not None for result in results) == 1
+        assert await snapshot(order_id, products) == ("processing", [3], {}, 1)
+
+    db(scenario())
+
+
+def test_cancel_twice_returns_stock_once(db):
+    async def scenario():
+        products = await create_products(5, 3)
+        order_id = await create_order({products[0]: 2, products[1]: 3})
+        checkout = await checkout_order(order_id, USER_ID, **DELIVERY)
+
+        await cancel_order(order_id, checkout)
+        await cancel_order(order_id, checkout)
+
+        assert await snapshot(order_id, products) == ("cancelled", [5, 3], {products[0]: 2, products[1]: 3}, 2)
+
+    db(scenario())
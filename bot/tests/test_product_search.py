@@ -0,0 +1,55 @@
+import pytest
+
+from bot.src.keyboards.main_menu import product_search_text
+from bot.src.services.repository import get_new_products, get_pool
+
+
+@pytest.mark.parametrize(
+    "query, text",
+    [
+        ("поиск чай", "чай"),
+        ("Поиск  зеленый чай ", "зеленый чай"),
+        ("поиск ", ""),
+        ("поиск", ""),
+        ("поиска доставки", None),
+        ("поисковик", None),
+        ("доставка", None),
+        ("", None),
+    ],
+)
+def test_product_search_text(query, text):
+    assert product_search_text(query) == text
+
+
+def test_new_products_pages(db):
+    async def scenario():
+        pool = await get_pool()
+        category_id = await pool.fetchval(
+            "INSERT INTO app_category (title, slug, is_active) VALUES ('Чай', 'tea', true) RETURNING id"
+        )
+        subcategory_id = await pool.fetchval(
+            "INSERT INTO app_subcategory (category_id, title, slug, is_active) "
+            "VALUES ($1, 'Зеленый', 'green-tea', true) RETURNING id",
+            category_id,
+        )
+        for number, is_active in enumerate((True, True, False, True)):
+            await pool.execute(
+                "INSERT INTO app_product "
+                "(subcategory_id, title, slug, price, stock, is_active, created_at, updated_at) "
+                "VALUES ($1, $2, $3, 100, 1, $4, now() + make_interval(mins => $5), now())",
+                subcategory_id,
+                f"Товар {number}",
+                f"product-{number}",
+                is_active,
+                number,
+            )
+
+        first = await get_new_products(limit=2)
+        assert [product.title for product in first["products"]] == ["Товар 3", "Товар 1"]
+        assert first["next_offset"] == 2
+
+        second = await get_new_products(offset=2, limit=2)
+        assert [product.title for product in second["products"]] == ["Товар 0"]
+        assert second["next_offset"] is None
+
+    db(scenario())
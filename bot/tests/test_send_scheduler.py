@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from aiogram.methods import GetChatMember, SendMessage
+
+from bot.src.middlewares.send_scheduler import SendScheduler
+
+
+async def make_request(bot, method):
+    return True
+
+
+async def send_all(scheduler: SendScheduler, methods: list) -> float:
+    """Отправляет запросы одновременно, возвращает затраченное время."""
+
+    started = time.monotonic()
+    await asyncio.gather(*(scheduler(make_request, None, method) for method in methods))
+
+    return time.monotonic() - started
+
+
+def test_global_rate():
+    scheduler = SendScheduler(10)
+    methods = [SendMessage(chat_id=chat_id, text="Заказ оплачен") for chat_id in range(1, 16)]
+
+    # 10 сообщений сразу, еще 5 - за полсекунды
+    elapsed = asyncio.run(send_all(scheduler, methods))
+
+    assert 0.4 < elapsed < 1
+    assert scheduler.stats()["sent"] == 15
+
+
+def test_rate_below_one_message_per_second():
+    scheduler = SendScheduler()
+    scheduler.set_rate(0.5)
+
+    elapsed = asyncio.run(send_all(scheduler, [SendMessage(chat_id=1, text="Заказ оплачен")]))
+
+    assert elapsed < 0.1
+
+
+def test_reads_are_not_limited():
+    scheduler = SendScheduler(1)
+    methods = [GetChatMember(chat_id="@channel", user_id=user_id) for user_id in range(1, 11)]
+
+    assert asyncio.run(send_all(scheduler, methods)) < 0.1
+    assert scheduler.stats()["sent"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.src.services.subscriptions import SubscriptionCache
+
+
+class ChannelBot:
+    """Отвечает на get_chat_member текущим статусом пользователя в канале и считает запросы."""
+
+    def __init__(self, status: str):
+        self.status = status
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(status=self.status)
+
+
+def test_cached_refusal_is_reused():
+    async def scenario():
+        cache = SubscriptionCache("@channel")
+        bot = ChannelBot("left")
+
+        assert not await cache.is_subscribed(bot, 1)
+        bot.status = "member"
+        assert not await cache.is_subscribed(bot, 1)
+        assert bot.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_refresh_skips_cached_refusal():
+    async def scenario():
+        cache = SubscriptionCache("@channel")
+        bot = ChannelBot("left")
+        assert not await cache.is_subscribed(bot, 1)
+
+        bot.status = "member"
+        assert await cache.is_subscribed(bot, 1, refresh=True)
+        assert await cache.is_subscribed(bot, 1)
+        assert bot.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_refresh_is_single_flight():
+    async def scenario():
+        cache = SubscriptionCache("@channel")
+        bot = ChannelBot("member")
+
+        results = await asyncio.gather(*(cache.is_subscribed(bot, 1, refresh=True) for _ in range(5)))
+        assert results == [True] * 5
+        assert bot.calls == 1
+
+    asyncio.run(scenario())
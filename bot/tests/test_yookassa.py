@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.src.payment_yookassa import payment_handler
+from bot.src.payment_yookassa.fake_server import create_app
+from bot.src.payment_yookassa.payment_handler import YooKassaClient, YooKassaError, create_yookassa_payment
+
+ORDER_ID = 42
+
+
+def run_with_fake_server(monkeypatch, scenario, faults=()):
+    """Запускает scenario(app) с клиентом ЮКассы, который обращается к fake-серверу."""
+
+    async def main():
+        app = create_app()
+        app["faults"].extend(faults)
+        async with TestServer(app) as server:
+            client = YooKassaClient("shop", "secret", api_url=str(server.make_url("/v3")))
+            monkeypatch.setattr(payment_handler, "yookassa_client", client)
+            try:
+                await scenario(app)
+            finally:
+                await client.close()
+
+    asyncio.run(main())
+
+
+def test_payment_retried_with_same_idempotence_key(monkeypatch):
+    faults = [
+        web.json_response({"type": "error", "code": "internal_server_error"}, status=500),
+        web.Response(text="<html><body>502 Bad Gateway</body></html>", content_type="text/html"),
+    ]
+
+    async def scenario(app):
+        payment = await create_yookassa_payment(ORDER_ID, 1001, 500)
+
+        assert list(app["payments"]) == [payment.id]
+        assert payment.amount.value == 500
+        assert payment.confirmation.confirmation_url.endswith(f"/checkout/{payment.id}")
+
+        key = str(uuid.uuid5(uuid.NAMESPACE_URL, f"order:{ORDER_ID}"))
+        assert [request["idempotence_key"] for request in app["requests"]] == [key] * 3
+
+    run_with_fake_server(monkeypatch, scenario, faults)
+
+
+def test_repeated_order_returns_same_payment(monkeypatch):
+    async def scenario(app):
+        first = await create_yookassa_payment(ORDER_ID, 1001, 500)
+        second = await create_yookassa_payment(ORDER_ID, 1001, 500)
+
+        assert first.id == second.id
+        assert len(app["payments"]) == 1
+
+    run_with_fake_server(monkeypatch, scenario)
+
+
+def test_client_error_is_not_retried(monkeypatch):
+    faults = [web.json_response({"type": "error", "code": "invalid_credentials"}, status=401)]
+
+    async def scenario(app):
+        with pytest.raises(YooKassaError, match="401"):
+            await create_yookassa_payment(ORDER_ID, 1001, 500)
+
+        assert len(app["requests"]) == 1
+        assert app["payments"] == {}
+
+    run_with_fake_server(monkeypatch, scenario, faults)